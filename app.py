@@ -1,35 +1,75 @@
 from flask import (
-    Flask, render_template, request, jsonify, send_file, redirect, url_for, make_response
+    Flask, render_template, request, jsonify, send_file, redirect, url_for, make_response,
+    Response, stream_with_context
 )
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import os
 import io
-import tempfile
+import json
+import time
 
 # Load environment variables
 load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Plagiarism pair scoring: "thread" or "process" pool, worker count, per-pair timeout (s)
+PLAGIARISM_BACKEND = os.getenv("PLAGIARISM_BACKEND", "thread")
+PLAGIARISM_WORKERS = int(os.getenv("PLAGIARISM_WORKERS", "0")) or None
+PLAGIARISM_PAIR_TIMEOUT = float(os.getenv("PLAGIARISM_PAIR_TIMEOUT", "0")) or None
 
 # Import feature modules
-from features.ocr_extractor import extract_text_from_file
-from features.plagiarism_checker import check_plagiarism_from_files, check_plagiarism_from_strings
-from features.rag_pdf_chatbot import answer_from_pdf
-from features.webURL_analyzer import analyze as web_analyze
+from features.ocr_extractor import (
+    extract_text_cached, process_image_batch, stream_pdf_ocr, preload_ocr, ocr_status, ocr_cache_stats
+)
+from features.plagiarism_checker import (
+    check_plagiarism_from_files, check_plagiarism_from_strings, stream_plagiarism_from_files,
+    add_files_to_corpus, remove_from_corpus, list_corpus, check_file_against_corpus
+)
+from features.plagiarism_results import result_store, SpooledRows, EXPORT_FORMATS
+from plag.lsh import lsh_threshold_supported
+from python_scripts.document_store import QuotaExceeded, document_owner, get_document_store
+from python_scripts.llm_gateway import get_llm_gateway
+from features.rag_pdf_chatbot import ingest_pdf, answer_from_document, stream_answer_from_document
+from features.webURL_analyzer import analyze as web_analyze, stream_analyze as web_stream_analyze
 from features.youtube_analyzer import (
-    extract_and_save_transcript, ask_question_over_transcript, summarize_transcript
+    extract_and_save_transcript, load_transcript, ask_question_over_transcript, summarize_transcript,
+    stream_question_over_transcript, stream_summary
 )
 
-# Groq/OpenAI client (if needed)
-try:
-    from groq import Groq
-    groq_client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
-except ImportError:
-    groq_client = None
+# Every feature sends its LLM requests through this shared, rate-limited client
+llm = get_llm_gateway()
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
+# Per OCR_PRELOAD; at import time, so a preforking server that imports the
+# app before forking shares the loaded weights with its workers
+preload_ocr()
+
 # ========== API ROUTES FOR FRONTEND AJAX ==========
+def request_owner():
+    """Who the request's stored documents belong to (see document_owner)."""
+    return document_owner(request.headers, request.remote_addr)
+
+
+def sse_response(events, first_event=None):
+    """
+    Streams events (dicts with an 'event' name) as Server-Sent Events. When
+    the client disconnects the events generator is closed, which cancels
+    the upstream LLM generation.
+    """
+    def generate():
+        try:
+            if first_event is not None:
+                yield f"event: {first_event['event']}\ndata: {json.dumps(first_event)}\n\n"
+            for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'event': 'error', 'error': str(e)})}\n\n"
+        finally:
+            events.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
 
 @app.route('/api/ocr', methods=['POST'])
 def api_ocr():
@@ -38,11 +78,89 @@ def api_ocr():
         return jsonify({'success': False, 'error': "No file selected."}), 400
     try:
         file.stream.seek(0)
-        text = extract_text_from_file(file.stream)
+        _, text = extract_text_cached(file.stream.read())
         return jsonify({'success': True, 'extracted_text': text})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/ocr/ready', methods=['GET'])
+def api_ocr_ready():
+    status = ocr_status()
+    return jsonify({'success': status['ready'], **status}), 200 if status['ready'] else 503
+
+@app.route('/api/ocr/cache', methods=['GET'])
+def api_ocr_cache():
+    stats = ocr_cache_stats()
+    if stats is None:
+        return jsonify({'success': False, 'error': "OCR cache is disabled."}), 404
+    return jsonify({'success': True, **stats})
+
+@app.route('/api/llm/stats', methods=['GET'])
+def api_llm_stats():
+    return jsonify({'success': True, 'configured': llm.configured, **llm.stats()})
+
+@app.route('/api/ocr/batch', methods=['POST'])
+def api_ocr_batch():
+    files = [f for f in request.files.getlist('images') if f.filename]
+    archive = request.files.get('archive')
+    if archive is not None and archive.filename == '':
+        archive = None
+    if not files and archive is None:
+        return jsonify({'success': False, 'error': "Upload images or a zip archive."}), 400
+    start = time.perf_counter()
+    try:
+        results = process_image_batch(files, archive.stream if archive is not None else None)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({
+        'success': True,
+        'results': results,
+        'total_seconds': round(time.perf_counter() - start, 3)
+    })
+
+@app.route('/api/ocr/pdf', methods=['POST'])
+def api_ocr_pdf():
+    """OCRs a scanned PDF, streaming one NDJSON event per page."""
+    file = request.files.get('pdf')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'error': "No file selected."}), 400
+    if not file.filename.lower().endswith('.pdf'):
+        return jsonify({'success': False, 'error': "Please upload a PDF file."}), 400
+    options = {}
+    try:
+        if request.form.get('dpi'):
+            options['dpi'] = int(request.form['dpi'])
+            if not 36 <= options['dpi'] <= 600:
+                raise ValueError
+        if request.form.get('max_pages'):
+            options['max_pages'] = int(request.form['max_pages'])
+    except ValueError:
+        return jsonify({'success': False, 'error': "dpi must be 36-600 and max_pages an integer."}), 400
+    # Stored now (the upload is closed once the streamed response starts)
+    # and read memory-mapped while the pages are rendered
+    store = get_document_store()
+    try:
+        stored, _ = store.put(file.stream, request_owner(), 'ocr_pdf', secure_filename(file.filename))
+        pdf = store.open(stored)
+    except QuotaExceeded as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    events = stream_pdf_ocr(pdf, **options)
+
+    def generate():
+        try:
+            for event in events:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({'event': 'error', 'error': str(e)}) + "\n"
+        finally:
+            events.close()
+            pdf.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
 @app.route('/api/ocr/download', methods=['POST'])
 def api_ocr_download():
     data = request.json
@@ -78,6 +196,30 @@ def api_ocr_download():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def plagiarism_compare_options(form):
+    """Builds compare_texts options from the deployment settings and the request form."""
+    compare_options = {'backend': PLAGIARISM_BACKEND, 'max_workers': PLAGIARISM_WORKERS}
+    if PLAGIARISM_BACKEND == 'process':
+        compare_options['pair_timeout'] = PLAGIARISM_PAIR_TIMEOUT
+    try:
+        # Optional: only score pairs the MinHash LSH index flags as candidates
+        if form.get('lsh_threshold'):
+            compare_options['lsh_threshold'] = float(form['lsh_threshold'])
+        # Optional: LCS (and matched passages) only for pairs that can reach this score (%)
+        if form.get('lcs_cutoff'):
+            compare_options['lcs_cutoff'] = float(form['lcs_cutoff'])
+    except ValueError:
+        raise ValueError("Invalid lsh_threshold or lcs_cutoff.")
+    lsh_threshold = compare_options.get('lsh_threshold')
+    if lsh_threshold is not None and not (0 <= lsh_threshold <= 1 and lsh_threshold_supported(lsh_threshold)):
+        raise ValueError("lsh_threshold must be between 0 and 0.98.")
+    lcs_cutoff = compare_options.get('lcs_cutoff')
+    if lcs_cutoff is not None and not 0 <= lcs_cutoff <= 100:
+        raise ValueError("lcs_cutoff must be between 0 and 100.")
+    # Optional: include the matched passages of every pair
+    compare_options['return_spans'] = form.get('return_spans', '').lower() in ('1', 'true', 'yes')
+    return compare_options
+
 @app.route('/api/plagiarism', methods=['POST'])
 def api_plagiarism():
     files = request.files.getlist('files[]')
@@ -85,17 +227,77 @@ def api_plagiarism():
         return jsonify({'success': False, 'error': "Please upload at least 2 files."}), 400
     file_names = [f.filename for f in files]
     try:
-        results = check_plagiarism_from_files(files, file_names)
-        return jsonify({'success': True, 'results': results, 'file_names': file_names})
+        compare_options = plagiarism_compare_options(request.form)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        results = check_plagiarism_from_files(files, file_names, **compare_options)
+        job_id = result_store.create(file_names, results)
+        return jsonify({'success': True, 'results': results, 'file_names': file_names, 'job_id': job_id})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/plagiarism/stream', methods=['POST'])
+def api_plagiarism_stream():
+    """
+    Same as /api/plagiarism, but streams one NDJSON event per scored pair.
+    The rows are spooled to a temporary file for /api/plagiarism/download
+    rather than collected in memory; only a file offset per pair is kept.
+    """
+    files = request.files.getlist('files[]')
+    if len(files) < 2:
+        return jsonify({'success': False, 'error': "Please upload at least 2 files."}), 400
+    file_names = [f.filename for f in files]
+    try:
+        compare_options = plagiarism_compare_options(request.form)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        events = stream_plagiarism_from_files(files, file_names, **compare_options)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/plagiarism/download', methods=['POST'])
+    def generate():
+        try:
+            rows = None
+            for event in events:
+                if event['event'] == 'start':
+                    # Rows are kept server-side as they arrive for /api/plagiarism/download
+                    rows = SpooledRows(event['total'])
+                    event['job_id'] = result_store.create(file_names, rows)
+                elif event['event'] == 'row':
+                    rows[event['position']] = event['row']
+                yield json.dumps(event, default=float) + "\n"
+        except Exception as e:
+            yield json.dumps({'event': 'error', 'error': str(e)}) + "\n"
+        finally:
+            events.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
+@app.route('/api/plagiarism/download', methods=['GET', 'POST'])
 def api_plagiarism_download():
-    data = request.json
+    data = request.args if request.method == 'GET' else request.json
+    fmt = data.get('format', 'csv')
+    if data.get('job_id'):
+        # Stream the export straight from the server-side result store
+        job = result_store.get(data['job_id'])
+        if job is None:
+            return jsonify({'success': False, 'error': "Unknown or expired job_id."}), 404
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': "Invalid format"}), 400
+        export, mimetype, extension = EXPORT_FORMATS[fmt]
+        try:
+            chunks = export(job.rows)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        filename = secure_filename(data.get('filename', '')) or f"similarity_results.{extension}"
+        return Response(chunks, mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
     table = data.get('table')
     filename = data.get('filename', 'results.csv')
-    fmt = data.get('format', 'csv')
     try:
         if fmt == 'csv':
             output = io.StringIO()
@@ -114,33 +316,95 @@ def api_plagiarism_download():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/plagiarism/corpus', methods=['GET'])
+def api_plagiarism_corpus_list():
+    try:
+        return jsonify({'success': True, 'documents': list_corpus()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/plagiarism/corpus', methods=['POST'])
+def api_plagiarism_corpus_add():
+    files = request.files.getlist('files[]')
+    if not files:
+        return jsonify({'success': False, 'error': "Please upload at least 1 file."}), 400
+    try:
+        added = add_files_to_corpus(files, [f.filename for f in files])
+        return jsonify({'success': True, 'added': added})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/plagiarism/corpus/<path:file_name>', methods=['DELETE'])
+def api_plagiarism_corpus_remove(file_name):
+    try:
+        if not remove_from_corpus(file_name):
+            return jsonify({'success': False, 'error': "Document not found."}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/plagiarism/corpus/check', methods=['POST'])
+def api_plagiarism_corpus_check():
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'error': "No file selected."}), 400
+    try:
+        limit = int(request.form.get('limit', 10))
+        matches = check_file_against_corpus(file, file.filename, limit=limit)
+        return jsonify({'success': True, 'file_name': file.filename, 'matches': matches})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/rag_pdf/upload', methods=['POST'])
 def api_rag_pdf_upload():
     pdf = request.files.get('pdf')
     if not pdf:
         return jsonify({'success': False, 'error': "PDF required."}), 400
-    # Store temporarily (simulate session, or return a temp token, or handle in memory)
+    # Extracted and chunked once here; questions use the stored document
     try:
-        temp = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        pdf.save(temp.name)
-        temp.close()
-        return jsonify({'success': True, 'temp_pdf': temp.name})
+        stored, document, deduplicated = ingest_pdf(pdf.stream, request_owner(), secure_filename(pdf.filename))
+        return jsonify({
+            'success': True,
+            'doc_id': stored.doc_id,
+            'chunks': len(document.chunks),
+            'deduplicated': deduplicated
+        })
+    except QuotaExceeded as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/rag_pdf/ask', methods=['POST'])
 def api_rag_pdf_ask():
-    temp_pdf = request.form.get('temp_pdf')
+    doc_id = request.form.get('doc_id')
     question = request.form.get('question', '')
-    if not temp_pdf or not question:
+    if not doc_id or not question:
         return jsonify({'success': False, 'error': "PDF and question required."}), 400
     try:
-        with open(temp_pdf, 'rb') as f:
-            answer = answer_from_pdf(f, question, temperature=0.2)
+        answer = answer_from_document(doc_id, question, temperature=0.2, owner=request_owner())
         return jsonify({'success': True, 'answer': answer})
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': "Unknown document; please upload the PDF again."}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/rag_pdf/ask/stream', methods=['POST'])
+def api_rag_pdf_ask_stream():
+    """Same as /api/rag_pdf/ask, but streams the answer as Server-Sent Events."""
+    doc_id = request.form.get('doc_id')
+    question = request.form.get('question', '')
+    if not doc_id or not question:
+        return jsonify({'success': False, 'error': "PDF and question required."}), 400
+    try:
+        events = stream_answer_from_document(doc_id, question, temperature=0.2, owner=request_owner())
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': "Unknown document; please upload the PDF again."}), 404
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return sse_response(events)
+
 @app.route('/api/web_analyze', methods=['POST'])
 def api_web_analyze():
     data = request.json
@@ -149,22 +413,38 @@ def api_web_analyze():
     if not url:
         return jsonify({'success': False, 'error': "URL required."}), 400
     try:
-        result = web_analyze(url, question, GROQ_API_KEY)
+        result = web_analyze(url, question)
         if "error" in result:
             return jsonify({'success': False, 'error': result["error"]}), 400
         return jsonify({'success': True, 'result': result})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/web_analyze/stream', methods=['POST'])
+def api_web_analyze_stream():
+    """Answers a question about a web page, streaming the answer as Server-Sent Events."""
+    data = request.json
+    url = data.get('url')
+    question = data.get('question', '')
+    if not url or not question:
+        return jsonify({'success': False, 'error': "URL and question required."}), 400
+    try:
+        result, events = web_stream_analyze(url, question)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return sse_response(events, first_event={'event': 'result', **result})
+
 @app.route('/api/youtube/extract', methods=['POST'])
 def api_youtube_extract():
     data = request.json
     youtube_url = data.get('url')
     if not youtube_url:
         return jsonify({'success': False, 'error': "YouTube URL required."}), 400
-    result = extract_and_save_transcript(youtube_url)
+    result = extract_and_save_transcript(youtube_url, owner=request_owner())
     if result['success']:
-        return jsonify({'success': True, 'transcript': result['transcript']})
+        return jsonify({'success': True, 'transcript': result['transcript'], 'doc_id': result['doc_id']})
     else:
         return jsonify({'success': False, 'error': result['error']}), 400
 
@@ -174,7 +454,7 @@ def api_youtube_ask():
     question = data.get('question', '')
     if not question:
         return jsonify({'success': False, 'error': "Question required."}), 400
-    result = ask_question_over_transcript(question, client=groq_client)
+    result = ask_question_over_transcript(question, owner=request_owner(), doc_id=data.get('doc_id'))
     if result['success']:
         return jsonify({'success': True, 'answer': result['answer']})
     else:
@@ -183,15 +463,41 @@ def api_youtube_ask():
 @app.route('/api/youtube/summarize', methods=['POST'])
 def api_youtube_summarize():
     data = request.json
-    transcript = data.get('transcript', '')
+    transcript = data.get('transcript') or load_transcript(request_owner(), data.get('doc_id'))
     if not transcript:
         return jsonify({'success': False, 'error': "Transcript required."}), 400
-    result = summarize_transcript(transcript, client=groq_client)
+    result = summarize_transcript(transcript)
     if result['success']:
         return jsonify({'success': True, 'summary': result['summary']})
     else:
         return jsonify({'success': False, 'error': result['error']}), 400
 
+@app.route('/api/youtube/ask/stream', methods=['POST'])
+def api_youtube_ask_stream():
+    """Same as /api/youtube/ask, but streams the answer as Server-Sent Events."""
+    data = request.json
+    question = data.get('question', '')
+    if not question:
+        return jsonify({'success': False, 'error': "Question required."}), 400
+    if not llm.configured:
+        return jsonify({'success': False, 'error': "Groq API key is not configured."}), 503
+    try:
+        events = stream_question_over_transcript(question, owner=request_owner(), doc_id=data.get('doc_id'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return sse_response(events)
+
+@app.route('/api/youtube/summarize/stream', methods=['POST'])
+def api_youtube_summarize_stream():
+    """Same as /api/youtube/summarize, but streams the summary as Server-Sent Events."""
+    data = request.json
+    transcript = data.get('transcript') or load_transcript(request_owner(), data.get('doc_id'))
+    if not transcript:
+        return jsonify({'success': False, 'error': "Transcript required."}), 400
+    if not llm.configured:
+        return jsonify({'success': False, 'error': "Groq API key is not configured."}), 503
+    return sse_response(stream_summary(transcript))
+
 # ========== STATIC FILES AND MAIN ROUTES ==========
 
 @app.route('/')
@@ -0,0 +1,219 @@
+"""
+Benchmarks for the plag/ metrics and end-to-end plagiarism checks.
+
+Generates synthetic corpora with a controlled amount of copied text, times
+every metric and check_plagiarism_from_strings over grids of document count
+and length, and records peak memory. Results are written as JSON and can be
+compared against a stored baseline; runs fully offline.
+
+    python -m benchmarks.bench_plagiarism --output bench.json
+    python -m benchmarks.bench_plagiarism --baseline bench.json --tolerance 0.25
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from features.plagiarism_checker import check_plagiarism_from_strings
+from plag.cosine_similarity import cosine_similarity_count, cosine_similarity_tfidf
+from plag.jaccard_similarity import jaccard_similarity
+from plag.lcs import lcs
+from plag.lsh import lsh_similarity
+from plag.n_gram_similarity import n_gram_similarity
+
+METRICS = {
+    "cosine_tfidf": cosine_similarity_tfidf,
+    "cosine_count": cosine_similarity_count,
+    "jaccard": jaccard_similarity,
+    "lcs": lcs,
+    "lsh": lsh_similarity,
+    "n_gram": n_gram_similarity,
+}
+
+
+def make_vocabulary(rng, size=5000):
+    """Pseudo-words of 2-10 lowercase letters."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(size)]
+
+
+def make_document(rng, vocabulary, words):
+    # Zipf-like word frequencies, like natural text
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return " ".join(rng.choices(vocabulary, weights=weights, k=words))
+
+
+def make_copy(rng, vocabulary, source, overlap, edit_rate=0.05):
+    """
+    A document whose first `overlap` fraction of words is copied from source
+    (with edit_rate of them replaced) and the rest is fresh text.
+    """
+    source_words = source.split()
+    copied = source_words[:int(len(source_words) * overlap)]
+    copied = [rng.choice(vocabulary) if rng.random() < edit_rate else word for word in copied]
+    fresh = make_document(rng, vocabulary, len(source_words) - len(copied)).split()
+    return " ".join(copied + fresh)
+
+
+def make_corpus(seed, documents, words, overlap):
+    """documents texts of about `words` words; every other one copies its predecessor."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    corpus = []
+    for index in range(documents):
+        if index % 2 and overlap > 0:
+            corpus.append(make_copy(rng, vocabulary, corpus[-1], overlap))
+        else:
+            corpus.append(make_document(rng, vocabulary, words))
+    return corpus
+
+
+def measure(func, repeat):
+    """Runs func repeat times; returns timing stats and the peak traced memory of one run."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "peak_bytes": peak,
+    }
+
+
+def bench_metrics(args):
+    results = []
+    for words in args.words:
+        doc1, doc2 = make_corpus(args.seed, 2, words, args.overlap)
+        for name, func in METRICS.items():
+            if name in args.skip:
+                continue
+            stats = measure(lambda: func(doc1, doc2), args.repeat)
+            results.append({"name": f"metric/{name}", "params": {"words": words}, **stats})
+            print(f"metric/{name:<13} words={words:<7} {stats['seconds']:.4f}s", file=sys.stderr)
+    return results
+
+
+def bench_end_to_end(args):
+    results = []
+    for documents in args.documents:
+        for words in args.words:
+            corpus = make_corpus(args.seed, documents, words, args.overlap)
+            stats = measure(lambda: check_plagiarism_from_strings(corpus), args.repeat)
+            results.append({
+                "name": "check_plagiarism_from_strings",
+                "params": {"documents": documents, "words": words},
+                **stats,
+            })
+            print(f"end_to_end documents={documents:<5} words={words:<7} {stats['seconds']:.4f}s",
+                  file=sys.stderr)
+    return results
+
+
+def result_key(result):
+    return result["name"], tuple(sorted(result["params"].items()))
+
+
+def compare_to_baseline(results, baseline, tolerance, min_delta=0.001):
+    """
+    Returns a list of regression descriptions: results whose best time is
+    slower than the matching baseline entry's by more than the tolerance (a
+    fraction) and by at least min_delta seconds, so timer noise on very fast
+    metrics doesn't count.
+    """
+    previous = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None or old["min_seconds"] <= 0:
+            continue
+        ratio = result["min_seconds"] / old["min_seconds"]
+        result["baseline_min_seconds"] = old["min_seconds"]
+        result["ratio"] = round(ratio, 3)
+        if ratio > 1 + tolerance and result["min_seconds"] - old["min_seconds"] >= min_delta:
+            regressions.append(
+                f"{result['name']} {result['params']}: {old['min_seconds']:.4f}s -> "
+                f"{result['min_seconds']:.4f}s ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def parse_int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=parse_int_list, default=[200, 2000],
+                        help="comma-separated document lengths in words")
+    parser.add_argument("--documents", type=parse_int_list, default=[10, 40],
+                        help="comma-separated document counts for the end-to-end check")
+    parser.add_argument("--overlap", type=float, default=0.5,
+                        help="fraction of words copied into every other document")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip", type=lambda value: value.split(","), default=[],
+                        help="comma-separated metrics to leave out")
+    parser.add_argument("--no-end-to-end", action="store_true")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown versus the baseline, as a fraction")
+    parser.add_argument("--min-delta", type=float, default=0.001,
+                        help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args(argv)
+
+    results = bench_metrics(args)
+    if not args.no_end_to_end:
+        results += bench_end_to_end(args)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "args": {key: value for key, value in vars(args).items()
+                     if key not in ("output", "baseline", "tolerance", "min_delta")},
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance, args.min_delta)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Benchmark of RAG chunk retrieval: BM25, embeddings, hybrid and word overlap.
+
+Compares BM25, local embeddings and their fusion with the word-overlap
+ranking build_context used before. Generates synthetic chunked documents
+and questions built from a few rare words of one target chunk (padded with
+question words and stopwords), then reports build and query latency and how
+often each ranking puts the target chunk in its top k (hit rate and mean
+reciprocal rank). Runs fully offline.
+
+    python -m benchmarks.bench_retrieval --output retrieval.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks.bench_plagiarism import make_document, make_vocabulary, measure, parse_int_list
+from python_scripts.bm25 import BM25Index
+from python_scripts.embeddings import VectorIndex, get_embedder, hybrid_top_k
+
+QUESTION_WORDS = ["what", "is", "the", "of", "how", "does", "a", "in", "about", "which", "and", "to"]
+
+
+def overlap_rank(chunks, question):
+    """The ranking build_context used before BM25: question words occurring in the chunk (as substrings)."""
+    return sorted(range(len(chunks)), key=lambda c: sum(1 for w in question.split() if w in chunks[c]),
+                  reverse=True)
+
+
+def make_questions(rng, chunks, count, rare_words=3):
+    """[(question, target chunk)]; each question uses rare_words of the target's least common words."""
+    frequency = Counter(word for chunk in chunks for word in chunk.split())
+    questions = []
+    for _ in range(count):
+        target = rng.randrange(len(chunks))
+        words = sorted(set(chunks[target].split()), key=lambda word: (frequency[word], word))
+        picked = words[:rare_words * 3]
+        rng.shuffle(picked)
+        question = rng.sample(QUESTION_WORDS, 4) + picked[:rare_words]
+        rng.shuffle(question)
+        questions.append((" ".join(question) + "?", target))
+    return questions
+
+
+def quality(rankings, questions, k):
+    """Hit rate at k and mean reciprocal rank (within the top k) of the target chunks."""
+    hits = 0
+    reciprocal = 0.0
+    for ranked, (_, target) in zip(rankings, questions):
+        top = list(ranked[:k])
+        if target in top:
+            hits += 1
+            reciprocal += 1 / (top.index(target) + 1)
+    return {"hit_rate": hits / len(questions), "mrr": reciprocal / len(questions)}
+
+
+def bench_retrieval(args):
+    results = []
+    for chunks_count in args.chunks:
+        rng = random.Random(args.seed)
+        vocabulary = make_vocabulary(rng, args.vocabulary)
+        chunks = [make_document(rng, vocabulary, args.chunk_words) for _ in range(chunks_count)]
+        questions = make_questions(rng, chunks, args.questions)
+        index = BM25Index.build(chunks)
+        vectors = VectorIndex.build(chunks, get_embedder(args.embedder))
+
+        def bm25_rankings():
+            return [[chunk for chunk, _ in index.top_k(question, args.k)] for question, _ in questions]
+
+        def embedding_rankings():
+            return [[chunk for chunk, _ in ranked]
+                    for ranked in vectors.top_k([question for question, _ in questions], args.k)]
+
+        def hybrid_rankings():
+            return [[chunk for chunk, _ in hybrid_top_k(index.scores(question), vectors.scores(question),
+                                                        args.k, args.semantic_weight)]
+                    for question, _ in questions]
+
+        def overlap_rankings():
+            return [overlap_rank(chunks, question)[:args.k] for question, _ in questions]
+
+        builders = {"bm25": lambda: BM25Index.build(chunks),
+                    args.embedder: lambda: VectorIndex.build(chunks, get_embedder(args.embedder))}
+        for name, rank in (("bm25", bm25_rankings), (args.embedder, embedding_rankings),
+                           ("hybrid", hybrid_rankings), ("overlap", overlap_rankings)):
+            result = {"method": name, "chunks": chunks_count, "chunk_words": args.chunk_words,
+                      "questions": len(questions), "k": args.k}
+            stats = measure(rank, args.repeat)
+            result.update(stats)
+            result["query_ms"] = 1000 * stats["seconds"] / len(questions)
+            result.update(quality(rank(), questions, args.k))
+            if name in builders:
+                result["build"] = measure(builders[name], args.repeat)
+            results.append(result)
+            print(f"{name:8} chunks={chunks_count:5} query={result['query_ms']:.3f}ms "
+                  f"hit@{args.k}={result['hit_rate']:.2f} mrr={result['mrr']:.2f}", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=parse_int_list, default=[20, 200, 2000],
+                        help="comma-separated chunk counts per document")
+    parser.add_argument("--chunk-words", type=int, default=300)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--k", type=int, default=3, help="chunks retrieved per question")
+    parser.add_argument("--embedder", default="lsa", help="embedder to compare (lsa or hashing)")
+    parser.add_argument("--semantic-weight", type=float, default=0.5,
+                        help="weight of the embeddings in the hybrid ranking")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "results": bench_retrieval(args),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
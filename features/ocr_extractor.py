@@ -1,9 +1,15 @@
 from flask import Blueprint, request, jsonify, render_template, send_file, current_app
+import io
 import os
-from python_scripts.ocr import extract_text_from_file
-from python_scripts.spelling_corrections import correct_spelling
+import time
+import zipfile
+from python_scripts.ocr import (
+    extract_text_from_file, extract_texts_from_images, iter_pdf_ocr, preload_ocr, ocr_status, OCR_CONFIG
+)
+from python_scripts.ocr_cache import get_ocr_cache, content_hash, stage_key
+from python_scripts.spelling_corrections import correct_spelling, SPELL_CONFIG
 from python_scripts.spacings import add_space_after_punctuation
-from python_scripts.groqllm import clean_text
+from python_scripts.groqllm import clean_text_with_status, CLEAN_TEXT_CONFIG
 from werkzeug.utils import secure_filename
 from fpdf import FPDF
 from docx import Document
@@ -11,21 +17,131 @@ from docx import Document
 ocr_bp = Blueprint('ocr', __name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-UPLOAD_FOLDER = 'uploads'
-TEMP_FOLDER = 'temp_files'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(TEMP_FOLDER, exist_ok=True)
+# Limits for one batch OCR request (image count, total uncompressed bytes)
+BATCH_MAX_IMAGES = int(os.getenv("OCR_BATCH_MAX_IMAGES", "100"))
+BATCH_MAX_BYTES = int(os.getenv("OCR_BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def read_batch_images(files, archive=None):
+    """
+    Collects the images of a batch OCR request: uploaded image files, then
+    the images inside an optional zip archive (in archive order, other
+    entries skipped). Returns a list of (name, bytes).
+    Raises ValueError for bad files or when the batch limits are exceeded.
+    """
+    images = []
+    total = 0
+    def add(name, data):
+        nonlocal total
+        total += len(data)
+        if len(images) >= BATCH_MAX_IMAGES:
+            raise ValueError(f"At most {BATCH_MAX_IMAGES} images per batch.")
+        if total > BATCH_MAX_BYTES:
+            raise ValueError(f"Batch exceeds {BATCH_MAX_BYTES} bytes of images.")
+        images.append((name, data))
+
+    for file in files:
+        if not allowed_file(file.filename):
+            raise ValueError(f"Invalid file type: {file.filename}")
+        add(file.filename, file.read())
+    if archive is not None:
+        try:
+            with zipfile.ZipFile(archive) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not allowed_file(info.filename):
+                        continue
+                    # Check the declared size before inflating anything
+                    if total + info.file_size > BATCH_MAX_BYTES:
+                        raise ValueError(f"Batch exceeds {BATCH_MAX_BYTES} bytes of images.")
+                    add(info.filename, zf.read(info))
+        except zipfile.BadZipFile:
+            raise ValueError("Invalid zip archive.")
+    return images
+
+def process_image_batch(files, archive=None):
+    """
+    OCRs a batch of uploads; returns per-image results in input order.
+    Images already in the OCR cache are not sent to the workers.
+    """
+    images = read_batch_images(files, archive)
+    cache = get_ocr_cache()
+    results = [None] * len(images)
+    keys = [stage_key(content_hash(data), "ocr", OCR_CONFIG) for _, data in images]
+    if cache is not None:
+        for index, key in enumerate(keys):
+            text = cache.get(key, "ocr")
+            if text is not None:
+                results[index] = {"text": text, "error": None, "seconds": 0.0, "cached": True}
+    misses = [index for index, result in enumerate(results) if result is None]
+    computed = extract_texts_from_images([images[index][1] for index in misses])
+    for index, result in zip(misses, computed):
+        if cache is not None and result["error"] is None:
+            cache.put(keys[index], "ocr", result["text"])
+        results[index] = {**result, "cached": False}
+    return [{"name": name, **result} for (name, _), result in zip(images, results)]
+
+def _cached_stage(parent_key, stage, config, compute, cacheable=lambda value: True):
+    # Returns (key, value) of one pipeline stage, from the cache when possible
+    key = stage_key(parent_key, stage, config)
+    cache = get_ocr_cache()
+    if cache is None:
+        return key, compute()
+    return key, cache.cached(key, stage, compute, cacheable)
+
+def extract_text_cached(data):
+    """Raw OCR text of image bytes, cached by content. Returns (stage key, text)."""
+    return _cached_stage(content_hash(data), "ocr", OCR_CONFIG,
+                         lambda: extract_text_from_file(io.BytesIO(data)))
+
 def process_image_pipeline(file_obj):
-    text = extract_text_from_file(file_obj)
-    text = correct_spelling(text)
-    text = add_space_after_punctuation(text)
-    text = clean_text(text)
+    # Each stage's output is cached under a key chained from the previous
+    # stage's, so re-uploads skip OCR and the LLM, and a config change in one
+    # stage only recomputes it and the stages after it.
+    key, text = extract_text_cached(file_obj.read())
+    key, text = _cached_stage(
+        key, "corrected", SPELL_CONFIG,
+        lambda: add_space_after_punctuation(correct_spelling(text))
+    )
+    # Only a cleanup in which every chunk succeeded is cached
+    failures = []
+    def clean():
+        cleaned, failed = clean_text_with_status(text)
+        failures.append(failed)
+        return cleaned
+    key, text = _cached_stage(
+        key, "cleaned", CLEAN_TEXT_CONFIG, clean, cacheable=lambda value: not any(failures)
+    )
     return text
 
+def stream_pdf_ocr(pdf, **options):
+    """
+    OCRs a scanned PDF (bytes or a file-like object) as a stream of events:
+    one {"event": "page", ...} per page (see iter_pdf_ocr) as soon as it is
+    read, then {"event": "summary"} with the page count and overall
+    throughput. options go to iter_pdf_ocr.
+    """
+    start = time.perf_counter()
+    pages = 0
+    megapixels = 0.0
+    for page in iter_pdf_ocr(pdf, **options):
+        pages += 1
+        megapixels += page["width"] * page["height"] / 1e6
+        yield {"event": "page", **page}
+    elapsed = time.perf_counter() - start
+    yield {
+        "event": "summary",
+        "pages": pages,
+        "elapsed_seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 3) if elapsed else None,
+        "megapixels_per_second": round(megapixels / elapsed, 2) if elapsed else None,
+    }
+
+def ocr_cache_stats():
+    cache = get_ocr_cache()
+    return cache.stats() if cache is not None else None
+
 @ocr_bp.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
@@ -53,27 +169,24 @@ def download():
     if not format_type:
         return 'No format specified', 400
     filename = f'extracted_text.{format_type}'
-    output_path = os.path.join(TEMP_FOLDER, filename)
+    # Built in memory: nothing is written to (or left behind on) disk
+    output = io.BytesIO()
     try:
         if format_type == 'txt':
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(text)
+            output.write(text.encode('utf-8'))
         elif format_type == 'pdf':
             pdf = FPDF()
             pdf.add_page()
             pdf.set_font("Arial", size=12)
             pdf.multi_cell(0, 10, txt=text)
-            pdf.output(output_path)
+            pdf.output(output)
         elif format_type == 'docx':
             doc = Document()
             doc.add_paragraph(text)
-            doc.save(output_path)
+            doc.save(output)
         else:
             return 'Invalid format type', 400
-        return_data = send_file(output_path, as_attachment=True, download_name=filename)
-        os.remove(output_path)
-        return return_data
+        output.seek(0)
+        return send_file(output, as_attachment=True, download_name=filename)
     except Exception as e:
-        if os.path.exists(output_path):
-            os.remove(output_path)
-        return f'Error creating file: {str(e)}', 500
\ No newline at end of file
+        return f'Error creating file: {str(e)}', 500
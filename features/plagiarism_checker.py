@@ -1,103 +1,527 @@
+import os
 import re
+import signal
 import numpy as np
-from PyPDF2 import PdfReader
-from plag.cosine_similarity import cosine_similarity_count, cosine_similarity_tfidf
-from plag.jaccard_similarity import jaccard_similarity
+from plag.cosine_similarity import (
+    cosine_similarity_count, cosine_similarity_tfidf, cosine_rows, cosine_similarity_pairs
+)
+from plag.jaccard_similarity import jaccard_similarity, jaccard_similarity_hashes
 from plag.lcs import lcs
-from plag.lsh import lsh_similarity
+from plag.lsh import lsh_similarity, signature_similarity, lsh_candidate_pairs
 from plag.n_gram_similarity import n_gram_similarity
-from concurrent.futures import ThreadPoolExecutor
+from plag.profile import build_profile
+from plag.fingerprint_index import FingerprintIndex
+from plag.passages import match_fingerprints, merge_matches
+from plag.winnowing import fingerprint
+from python_scripts.pdf_text import extract_pdf_text
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+
+# On-disk reference corpus checked by check_file_against_corpus
+REFERENCE_INDEX_PATH = os.getenv("PLAGIARISM_INDEX_PATH", "plagiarism_index.sqlite3")
+_reference_index = None
+
+# Pairs per thread-backend task when no block_size is given
+THREAD_BLOCK_PAIRS = int(os.getenv("PLAGIARISM_THREAD_BLOCK_PAIRS", "64"))
+
+# The one normaliser both preprocess functions use: lowercase, and drop
+# every character that is neither a word character nor whitespace
+_PUNCTUATION = re.compile(r'[^\w\s]')
 
 
 def preprocess_text(text):
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', '', text)
-    return text
+    return _PUNCTUATION.sub('', text.lower())
+
+
+def preprocess_text_with_offsets(text):
+    """
+    preprocess_text followed by whitespace normalization, also returning for
+    every output character the index of the character it came from in text.
+    Used to report matched passages in the coordinates of the original.
+    """
+    chars = []
+    offsets = []
+    pending_space = False
+    # Lowercased as a whole, like preprocess_text does (a final sigma
+    # lowercases differently from a lone one)
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        sources = range(len(text))
+    else:
+        # Some characters lowercase to several (e.g. 'İ')
+        sources = [index for index, char in enumerate(text) for _ in char.lower()]
+    for index, char in zip(sources, lowered):
+        if char.isspace():
+            pending_space = bool(chars)
+        elif not _PUNCTUATION.match(char):
+            if pending_space:
+                chars.append(' ')
+                offsets.append(index)
+                pending_space = False
+            chars.append(char)
+            offsets.append(index)
+    return ''.join(chars), np.array(offsets, dtype=np.int64)
 
 
-def extract_text_from_pdf(file_obj):
+def extract_text_from_pdf(file_obj, preprocess=True):
     try:
-        reader = PdfReader(file_obj)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text() or ''
-        return preprocess_text(text)
+        text = extract_pdf_text(file_obj)
+        return preprocess_text(text) if preprocess else text
     except Exception as e:
         raise ValueError(f"Error reading PDF: {e}")
 
 
-def extract_text_from_file(file_obj, filename=None):
+def extract_text_from_file(file_obj, filename=None, preprocess=True):
     # Determine by extension if PDF, otherwise treat as text
     if filename and filename.lower().endswith('.pdf'):
-        return extract_text_from_pdf(file_obj)
+        return extract_text_from_pdf(file_obj, preprocess=preprocess)
     else:
         try:
             text = file_obj.read().decode('utf-8')
-            return preprocess_text(text)
+            return preprocess_text(text) if preprocess else text
         except Exception as e:
             raise ValueError(f"Error reading text file: {e}")
 
 
-def compare_texts(texts, file_names=None):
+SIMILARITY_FUNCTIONS = {
+    "Cosine_TFIDF": cosine_similarity_tfidf,
+    "Cosine_Count": cosine_similarity_count,
+    "Jaccard": jaccard_similarity,
+    "LCS": lcs,
+    "LSH": lsh_similarity,
+    "NGram": n_gram_similarity
+}
+
+
+class PairTimeout(Exception):
+    """Raised inside a worker process when a pair exceeds its time limit."""
+
+
+def _raise_pair_timeout(signum, frame):
+    raise PairTimeout()
+
+
+class PairScorer:
     """
-    Compares a list of texts using similarity functions.
-    Returns a list of dicts with similarity results for each document pair.
+    Precomputed per-document state for one comparison run (normalized
+    TF-IDF and count rows, document profiles) and the per-pair scoring on
+    top of it. Nothing is stored per pair, so its size is linear in the
+    corpus. Kept picklable so the process backend can hand it to each
+    worker once.
     """
-    file_names = file_names if file_names else [f"Doc_{i + 1}" for i in range(len(texts))]
-    similarity_functions = {
-        "Cosine_TFIDF": cosine_similarity_tfidf,
-        "Cosine_Count": cosine_similarity_count,
-        "Jaccard": jaccard_similarity,
-        "LCS": lcs,
-        "LSH": lsh_similarity,
-        "NGram": n_gram_similarity
-    }
-
-    def compare_pair(i, j):
+
+    def __init__(self, texts, file_names, cosine_mode="corpus", block_size=None, num_perm=128,
+                 originals=None, return_spans=False, span_k=25, span_window=8,
+                 lcs_cutoff=None):
+        if cosine_mode not in ("corpus", "pairwise"):
+            raise ValueError(f"Unknown cosine_mode: {cosine_mode}")
+        self.lcs_cutoff = lcs_cutoff
+        self.texts = texts
+        self.file_names = file_names
+        self.originals = originals if originals is not None else texts
+        self.span_k = span_k
+        self.fingerprints = []
+        self.offsets = []
+        if return_spans:
+            for original in self.originals:
+                normalized, offsets = preprocess_text_with_offsets(original)
+                self.fingerprints.append(fingerprint(normalized, span_k, span_window))
+                self.offsets.append(offsets)
+        self.block_size = block_size
+        self.rows = {}
+        if cosine_mode == "corpus":
+            for name, weighting in (("Cosine_TFIDF", "tfidf"), ("Cosine_Count", "count")):
+                self.rows[name] = cosine_rows(texts, weighting)
+        self.profiles = [build_profile(text, num_perm=num_perm) for text in texts]
+
+    def similarity(self, name, i, j):
+        """Score in [0, 1] of metric name for documents i and j."""
+        if name in self.rows:
+            return cosine_similarity_pairs(self.rows[name], [(i, j)])[0]
+        profile1, profile2 = self.profiles[i], self.profiles[j]
+        if name == "Jaccard":
+            return jaccard_similarity_hashes(profile1.tokens, profile2.tokens)
+        if name == "LSH":
+            return signature_similarity(profile1.signature, profile2.signature)
+        if name == "NGram":
+            return jaccard_similarity_hashes(profile1.ngrams, profile2.ngrams)
+        return SIMILARITY_FUNCTIONS[name](self.texts[i], self.texts[j])
+
+    def matched_passages(self, i, j):
+        """
+        Passages shared by documents i and j, found by aligning their
+        fingerprints; offsets are character positions in the originals.
+        """
+        matched1, matched2 = match_fingerprints(*self.fingerprints[i], *self.fingerprints[j])
+        passages = []
+        for start1, end1, start2, end2 in merge_matches(matched1, matched2, self.span_k):
+            offsets1, offsets2 = self.offsets[i], self.offsets[j]
+            start1, end1 = int(offsets1[start1]), int(offsets1[end1 - 1]) + 1
+            start2, end2 = int(offsets2[start2]), int(offsets2[end2 - 1]) + 1
+            passages.append({
+                "Doc 1 Start": start1,
+                "Doc 1 End": end1,
+                "Doc 2 Start": start2,
+                "Doc 2 End": end2,
+                "Excerpt": self.originals[i][start1:end1],
+            })
+        return passages
+
+    def compare_pairs(self, pairs, timeout=None):
+        """
+        Result rows for a list of (i, j). The corpus-mode cosines of all the
+        pairs are computed first, block_size pairs per sparse product.
+        """
+        known = [{} for _ in pairs]
+        for name, rows in self.rows.items():
+            for scores, score in zip(known, cosine_similarity_pairs(rows, pairs, self.block_size)):
+                scores[name] = score
+        return [self.compare_pair(i, j, timeout=timeout, known=scores)
+                for (i, j), scores in zip(pairs, known)]
+
+    def compare_pair(self, i, j, timeout=None, known=None):
+        """
+        Result row for documents i and j. With a timeout (seconds, main thread
+        of a process only) the metrics still pending when it expires score 0.0.
+
+        With an lcs_cutoff (in %), LCS, by far the most expensive metric, is
+        computed with min_score set to it: its scan stops as soon as the pair
+        provably cannot reach the cutoff, and LCS is then reported as None
+        and left out of the average. The bound is sound, so an LCS at or
+        above the cutoff is never skipped. The other metrics always run.
+        Matched passages are skipped when no metric (LCS by its bound)
+        reaches the cutoff.
+
+        known maps metric names to scores (in [0, 1]) already computed.
+        """
+        scores = {}
+        bounds = {}
+        timed_out = False
+        try:
+            if timeout:
+                signal.signal(signal.SIGALRM, _raise_pair_timeout)
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            for name in SIMILARITY_FUNCTIONS:
+                try:
+                    if name == "LCS" and self.lcs_cutoff is not None:
+                        score = lcs(self.texts[i], self.texts[j], min_score=self.lcs_cutoff / 100)
+                        if score * 100 < self.lcs_cutoff:
+                            # An upper bound, not the score
+                            bounds[name] = score * 100
+                            continue
+                    elif known and name in known:
+                        score = known[name]
+                    else:
+                        score = self.similarity(name, i, j)
+                    scores[name] = round(float(score) * 100, 2)
+                except PairTimeout:
+                    raise
+                except Exception:
+                    scores[name] = 0.0
+        except PairTimeout:
+            timed_out = True
+        finally:
+            if timeout:
+                signal.signal(signal.SIGALRM, signal.SIG_IGN)
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, signal.SIG_DFL)
+
         row = {
-            "Doc 1": file_names[i],
-            "Doc 2": file_names[j]
+            "Doc 1": self.file_names[i],
+            "Doc 2": self.file_names[j]
         }
-        scores = []
-        for name, func in similarity_functions.items():
-            try:
-                score = round(func(texts[i], texts[j]) * 100, 2)
-            except Exception:
-                score = 0.0
-            row[name] = score
-            scores.append(score)
-        row["Average Similarity (%)"] = round(np.mean(scores), 2)
+        for name in SIMILARITY_FUNCTIONS:
+            if name in scores:
+                row[name] = scores[name]
+            else:
+                row[name] = 0.0 if timed_out else None
+        computed = [row[name] for name in SIMILARITY_FUNCTIONS if row[name] is not None]
+        row["Average Similarity (%)"] = round(np.mean(computed), 2)
+        if self.fingerprints:
+            skipped = bool(bounds) and not timed_out and \
+                max([*scores.values(), *bounds.values()]) < self.lcs_cutoff
+            row["Matches"] = None if skipped else self.matched_passages(i, j)
         return row
 
-    results = []
-    with ThreadPoolExecutor() as executor:
-        futures = []
-        for i in range(len(texts)):
-            for j in range(i + 1, len(texts)):
-                futures.append(executor.submit(compare_pair, i, j))
-        for future in futures:
-            results.append(future.result())
+
+# Set in each worker process by _init_worker
+_worker_scorer = None
+
+
+def _init_worker(scorer):
+    global _worker_scorer
+    _worker_scorer = scorer
+
+
+def _score_pairs(scorer, chunk, pair_timeout=None):
+    positions = [index for index, _ in chunk]
+    rows = scorer.compare_pairs([pair for _, pair in chunk], timeout=pair_timeout)
+    return list(zip(positions, rows))
+
+
+def _score_chunk(chunk, pair_timeout):
+    return _score_pairs(_worker_scorer, chunk, pair_timeout)
+
+
+def _balanced_chunks(pairs, texts, n_chunks):
+    """
+    Splits the pairs into about n_chunks consecutive chunks of similar cost,
+    estimating a pair's cost by the product of the two text lengths (the LCS
+    scan dominates). Each chunk is a list of (position, (i, j)).
+    """
+    costs = [max(len(texts[i]), 1) * max(len(texts[j]), 1) for i, j in pairs]
+    target = sum(costs) / max(n_chunks, 1)
+    chunks, chunk, chunk_cost = [], [], 0
+    for index, (pair, cost) in enumerate(zip(pairs, costs)):
+        chunk.append((index, pair))
+        chunk_cost += cost
+        if chunk_cost >= target:
+            chunks.append(chunk)
+            chunk, chunk_cost = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _iter_thread_results(scorer, pairs, max_workers, max_in_flight):
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+    max_in_flight = max_in_flight or max_workers * 4
+    # Consecutive chunks of block_size pairs, whose corpus-mode cosines are
+    # one sparse product each
+    indexed = enumerate(pairs)
+    chunk_size = scorer.block_size or THREAD_BLOCK_PAIRS
+    queue = iter(lambda: list(islice(indexed, chunk_size)), [])
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for chunk in islice(queue, max_in_flight):
+                pending.add(executor.submit(_score_pairs, scorer, chunk))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+                for chunk in islice(queue, len(done)):
+                    pending.add(executor.submit(_score_pairs, scorer, chunk))
+        finally:
+            # The consumer may stop early (e.g. a client disconnects)
+            for future in pending:
+                future.cancel()
+
+
+def _iter_process_results(scorer, pairs, max_workers, pair_timeout, max_in_flight):
+    # The scorer is pickled into every worker: its per-document state is
+    # held max_workers times over
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or max_workers * 2
+    # Several chunks per worker so one slow chunk doesn't leave the others idle
+    queue = iter(_balanced_chunks(pairs, scorer.texts, max_workers * 4))
+    pending = set()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(scorer,)) as executor:
+        try:
+            for chunk in islice(queue, max_in_flight):
+                pending.add(executor.submit(_score_chunk, chunk, pair_timeout))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+                for chunk in islice(queue, len(done)):
+                    pending.add(executor.submit(_score_chunk, chunk, pair_timeout))
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def stream_compare_texts(texts, file_names=None, cosine_mode="corpus", block_size=None,
+                         lsh_threshold=None, num_perm=128, backend="thread", max_workers=None,
+                         pair_timeout=None, return_spans=False, originals=None,
+                         lcs_cutoff=None, max_in_flight=None):
+    """
+    Compares a list of texts using similarity functions, incrementally.
+    Returns (number of pairs, iterator of (position, row)). Rows are yielded
+    as soon as they are scored, in completion order; position is the row's
+    index in the pair order compare_texts returns. At most max_in_flight
+    chunks of pairs are queued at a time, so
+    pending work and unconsumed rows don't pile up; the list of pairs to
+    score is still held (one index pair per pair).
+
+    cosine_mode="corpus" vectorizes all texts once (IDF over the whole
+    upload) and computes both cosine columns from the normalized vectors;
+    cosine_mode="pairwise" refits the vectorizers for every pair.
+    Only per-document vectors are kept; the cosines are computed per chunk
+    of pairs, block_size pairs (THREAD_BLOCK_PAIRS for the thread backend if
+    unset) per sparse product, so memory stays linear in the corpus.
+
+    Each document is profiled once (word and character n-gram hash sets plus
+    a MinHash signature); Jaccard, NGram and LSH are computed from those
+    profiles. If lsh_threshold is set, the signatures go into a banded LSH
+    index and only the candidate pairs it returns are scored; all other
+    pairs are left out of the results.
+
+    backend="thread" scores pairs in a thread pool; backend="process" hands
+    the precomputed state to each worker process once and schedules pairs
+    in cost-balanced chunks, which sidesteps the GIL for the pure-Python
+    metrics. Each worker holds its own copy of that state (the texts, their
+    vectors, profiles and fingerprints), which is linear in the corpus but
+    multiplied by max_workers. pair_timeout (seconds) is only supported by
+    the process backend.
+
+    With return_spans=True each row also gets a "Matches" list of copied
+    passages (character offsets in both originals plus the excerpt), found
+    by aligning winnowing fingerprints in near-linear time. originals are
+    the unprocessed texts the offsets refer to (defaults to texts).
+
+    lcs_cutoff (in %) stops the LCS scan (and skips the matched passages)
+    of pairs whose LCS provably stays below it, by a sound upper bound.
+    Their LCS cells are None; the other metrics are always computed.
+    """
+    file_names = file_names if file_names else [f"Doc_{i + 1}" for i in range(len(texts))]
+    if backend not in ("thread", "process"):
+        raise ValueError(f"Unknown backend: {backend}")
+    if pair_timeout and backend != "process":
+        raise ValueError("pair_timeout requires the process backend")
+    scorer = PairScorer(texts, file_names, cosine_mode=cosine_mode, block_size=block_size,
+                        num_perm=num_perm, originals=originals, return_spans=return_spans,
+                        lcs_cutoff=lcs_cutoff)
+
+    if lsh_threshold is None:
+        pairs = [(i, j) for i in range(len(texts)) for j in range(i + 1, len(texts))]
+    else:
+        signatures = [profile.signature for profile in scorer.profiles]
+        pairs = lsh_candidate_pairs(signatures, threshold=lsh_threshold, num_perm=num_perm)
+
+    if backend == "thread":
+        rows = _iter_thread_results(scorer, pairs, max_workers, max_in_flight)
+    else:
+        rows = _iter_process_results(scorer, pairs, max_workers, pair_timeout, max_in_flight)
+    return len(pairs), rows
+
+
+def compare_texts(texts, file_names=None, **options):
+    """
+    Compares a list of texts using similarity functions.
+    Returns a list of dicts with similarity results for each document pair,
+    in pair order whatever the backend. options are the keyword arguments
+    of stream_compare_texts.
+    """
+    total, rows = stream_compare_texts(texts, file_names, **options)
+    results = [None] * total
+    for position, row in rows:
+        results[position] = row
     return results
 
 
-def check_plagiarism_from_files(file_objs, file_names):
+def _read_files(file_objs, file_names, compare_options):
+    texts = []
+    originals = []
+    for file_obj, fname in zip(file_objs, file_names):
+        file_obj.seek(0)  # Always reset before reading
+        original = extract_text_from_file(file_obj, fname, preprocess=False)
+        originals.append(original)
+        texts.append(preprocess_text(original))
+    if compare_options.get("return_spans"):
+        compare_options.setdefault("originals", originals)
+    return texts
+
+
+def check_plagiarism_from_files(file_objs, file_names, **compare_options):
     """
     file_objs: list of file-like objects (uploaded files)
     file_names: list of filenames (to identify type and for reporting)
+    compare_options: extra keyword arguments for compare_texts
     Returns: list of similarity result dicts
     """
-    texts = []
-    for file_obj, fname in zip(file_objs, file_names):
-        file_obj.seek(0)  # Always reset before reading
-        texts.append(extract_text_from_file(file_obj, fname))
-    return compare_texts(texts, file_names)
+    texts = _read_files(file_objs, file_names, compare_options)
+    return compare_texts(texts, file_names, **compare_options)
+
+
+def stream_plagiarism_from_files(file_objs, file_names, **compare_options):
+    """
+    Streaming form of check_plagiarism_from_files. The files are read and the
+    comparison set up before returning, so input errors raise immediately.
+    Returns: iterator of event dicts -- one "start" event with the number of
+    pairs, a "row" event per pair as soon as it is scored (with its position
+    in pair order and progress counters), and a final "summary" event.
+    """
+    started = time.monotonic()
+    texts = _read_files(file_objs, file_names, compare_options)
+    total, rows = stream_compare_texts(texts, file_names, **compare_options)
+
+    def events():
+        yield {"event": "start", "total": total, "file_names": list(file_names)}
+        completed = 0
+        highest = None
+        average_sum = 0.0
+        for position, row in rows:
+            completed += 1
+            average = row["Average Similarity (%)"]
+            average_sum += average
+            if highest is None or average > highest["Average Similarity (%)"]:
+                highest = row
+            yield {"event": "row", "position": position, "completed": completed,
+                   "total": total, "row": row}
+        yield {
+            "event": "summary",
+            "completed": completed,
+            "total": total,
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+            "mean_similarity": round(average_sum / completed, 2) if completed else None,
+            "most_similar": {key: highest[key] for key in ("Doc 1", "Doc 2", "Average Similarity (%)")}
+            if highest else None,
+        }
+
+    return events()
 
 
-def check_plagiarism_from_strings(texts, names=None):
+def check_plagiarism_from_strings(texts, names=None, **compare_options):
     """
     texts: list of strings
     names: list of labels for reporting (optional)
+    compare_options: extra keyword arguments for compare_texts
     Returns: list of similarity result dicts
     """
     processed_texts = [preprocess_text(t) for t in texts]
-    return compare_texts(processed_texts, names)
\ No newline at end of file
+    if compare_options.get("return_spans"):
+        compare_options.setdefault("originals", texts)
+    return compare_texts(processed_texts, names, **compare_options)
+
+
+def get_reference_index():
+    global _reference_index
+    if _reference_index is None:
+        _reference_index = FingerprintIndex(REFERENCE_INDEX_PATH)
+    return _reference_index
+
+
+def add_files_to_corpus(file_objs, file_names):
+    """
+    Adds uploaded files to the persistent reference corpus, replacing any
+    document already indexed under the same filename.
+    Returns: list of indexed filenames
+    """
+    index = get_reference_index()
+    for file_obj, fname in zip(file_objs, file_names):
+        file_obj.seek(0)
+        index.add(fname, extract_text_from_file(file_obj, fname))
+    return list(file_names)
+
+
+def remove_from_corpus(file_name):
+    """Removes a document from the reference corpus. Returns False if it was not indexed."""
+    return get_reference_index().remove(file_name)
+
+
+def list_corpus():
+    """Returns: list of filenames in the reference corpus"""
+    return get_reference_index().documents()
+
+
+def check_file_against_corpus(file_obj, filename, limit=10):
+    """
+    Checks one uploaded file against the reference corpus.
+    Returns: list of match dicts, best match first
+    """
+    file_obj.seek(0)
+    return get_reference_index().check(extract_text_from_file(file_obj, filename), limit=limit)
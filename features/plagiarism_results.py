@@ -0,0 +1,278 @@
+import csv
+import html
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from array import array
+from collections import OrderedDict
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None  # Parquet/Arrow exports unavailable
+
+from features.plagiarism_checker import SIMILARITY_FUNCTIONS
+
+RESULT_COLUMNS = ["Doc 1", "Doc 2", *SIMILARITY_FUNCTIONS, "Average Similarity (%)"]
+
+# Jobs expire after RESULT_TTL seconds; least recently used jobs are evicted
+# once the store holds more than RESULT_MAX_ROWS rows in total.
+RESULT_TTL = float(os.getenv("PLAGIARISM_RESULT_TTL", "3600"))
+RESULT_MAX_ROWS = int(os.getenv("PLAGIARISM_RESULT_MAX_ROWS", "1000000"))
+# Rows of a streaming check are spooled to a temporary file, kept in memory
+# up to this many bytes per job and moved to disk beyond that
+RESULT_SPOOL_BYTES = int(os.getenv("PLAGIARISM_RESULT_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+EXPORT_ROWS_PER_CHUNK = 2000
+
+
+class PlagiarismJob:
+    """Results of one plagiarism check, in pair order."""
+    __slots__ = ("job_id", "file_names", "rows", "created", "last_access")
+
+    def __init__(self, job_id, file_names, rows):
+        self.job_id = job_id
+        self.file_names = file_names
+        self.rows = rows
+        self.created = self.last_access = time.monotonic()
+
+
+class ResultStore:
+    """
+    In-process store of plagiarism results keyed by job ID, with TTL expiry
+    and least-recently-used eviction bounded by the total number of rows.
+    """
+
+    def __init__(self, ttl=RESULT_TTL, max_rows=RESULT_MAX_ROWS):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, file_names, rows):
+        """
+        Stores rows (a list, possibly still being filled in by a streaming
+        check) and returns the new job ID.
+        """
+        job = PlagiarismJob(uuid.uuid4().hex, list(file_names), rows)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict()
+        return job.job_id
+
+    def get(self, job_id):
+        """Returns the PlagiarismJob, or None if it is unknown or expired."""
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.last_access = time.monotonic()
+                self._jobs.move_to_end(job_id)
+            return job
+
+    def _evict(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self._jobs.items() if now - job.created > self.ttl]:
+            _close_rows(self._jobs.pop(job_id))
+        total_rows = sum(len(job.rows) for job in self._jobs.values())
+        # Keep at least the newest job even if it alone exceeds the budget
+        while total_rows > self.max_rows and len(self._jobs) > 1:
+            _, job = self._jobs.popitem(last=False)
+            total_rows -= len(job.rows)
+            _close_rows(job)
+
+
+def _close_rows(job):
+    # Frees the spool file of a streamed job (a download still reading it fails)
+    close = getattr(job.rows, "close", None)
+    if close is not None:
+        close()
+
+
+result_store = ResultStore()
+
+
+class SpooledRows:
+    """
+    Rows of a streaming check, stored as they arrive (in any order) as JSON
+    lines in a spooled temporary file. Only a file offset per pair is kept
+    in memory. Iterates in pair order, yielding None for pairs not scored
+    yet, like the list a finished check stores.
+    """
+
+    def __init__(self, total, spool_bytes=RESULT_SPOOL_BYTES):
+        self._file = tempfile.SpooledTemporaryFile(max_size=spool_bytes, mode="w+b")
+        self._offsets = array("q", [-1]) * total
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __setitem__(self, position, row):
+        line = json.dumps(row, default=float).encode("utf-8") + b"\n"
+        with self._lock:
+            self._file.seek(0, io.SEEK_END)
+            self._offsets[position] = self._file.tell()
+            self._file.write(line)
+
+    def __iter__(self):
+        for offset in self._offsets:
+            if offset < 0:
+                yield None
+                continue
+            with self._lock:
+                self._file.seek(offset)
+                line = self._file.readline()
+            yield json.loads(line)
+
+    def close(self):
+        self._file.close()
+
+
+def _export_value(value):
+    # LCS skipped by the LCS cutoff is None
+    return "skipped" if value is None else value
+
+
+def _row_batches(rows):
+    batch = []
+    for row in rows:
+        if row is None:  # Not scored yet (streaming check still running)
+            continue
+        batch.append(row)
+        if len(batch) >= EXPORT_ROWS_PER_CHUNK:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv(rows):
+    """Yields the CSV export of rows in chunks of EXPORT_ROWS_PER_CHUNK rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(RESULT_COLUMNS)
+    for batch in _row_batches(rows):
+        for row in batch:
+            writer.writerow([_export_value(row.get(column)) for column in RESULT_COLUMNS])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_csv_gzip(rows):
+    """Yields the gzip-compressed CSV export of rows, compressed as it is produced."""
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in iter_csv(rows):
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_html(rows, title="Document Similarity Analysis Report"):
+    """Yields an HTML report of rows in chunks."""
+    header = "".join(f"<th>{html.escape(column)}</th>" for column in RESULT_COLUMNS)
+    yield (
+        f"<!DOCTYPE html>\n<html>\n<head><title>{html.escape(title)}</title></head>\n<body>\n"
+        f"<h1>{html.escape(title)}</h1>\n"
+        f"<table>\n<thead><tr>{header}</tr></thead>\n<tbody>\n"
+    ).encode("utf-8")
+    for batch in _row_batches(rows):
+        yield "".join(
+            "<tr>" + "".join(
+                f"<td>{html.escape(str(_export_value(row.get(column))))}</td>" for column in RESULT_COLUMNS
+            ) + "</tr>\n"
+            for row in batch
+        ).encode("utf-8")
+    yield b"</tbody>\n</table>\n</body>\n</html>\n"
+
+
+class _DrainableSink:
+    """Write-only file object whose written bytes can be taken out as they come."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema():
+    fields = [pyarrow.field("Doc 1", pyarrow.string()), pyarrow.field("Doc 2", pyarrow.string())]
+    fields += [pyarrow.field(column, pyarrow.float64()) for column in RESULT_COLUMNS[2:]]
+    return pyarrow.schema(fields)
+
+
+def _arrow_batch(batch, schema):
+    # Skipped metrics become nulls
+    return pyarrow.record_batch(
+        [[row.get(column) for row in batch] for column in RESULT_COLUMNS], schema=schema
+    )
+
+
+def _iter_columnar(rows, open_writer):
+    # Checked before the first chunk so callers can report it up front
+    if pyarrow is None:
+        raise ValueError("Parquet/Arrow export requires pyarrow")
+    return _columnar_chunks(rows, open_writer)
+
+
+def _columnar_chunks(rows, open_writer):
+    schema = _arrow_schema()
+    sink = _DrainableSink()
+    writer = open_writer(sink, schema)
+    for batch in _row_batches(rows):
+        writer.write_batch(_arrow_batch(batch, schema))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def iter_parquet(rows):
+    """Yields a Parquet file of rows, one row group per chunk (requires pyarrow)."""
+    return _iter_columnar(rows, lambda sink, schema: pyarrow.parquet.ParquetWriter(sink, schema))
+
+
+def iter_arrow(rows):
+    """Yields an Arrow IPC stream of rows, one record batch per chunk (requires pyarrow)."""
+    return _iter_columnar(rows, lambda sink, schema: pyarrow.ipc.new_stream(sink, schema))
+
+
+# format -> (chunk generator, mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "csv.gz": (iter_csv_gzip, "application/gzip", "csv.gz"),
+    "html": (iter_html, "text/html", "html"),
+    "parquet": (iter_parquet, "application/vnd.apache.parquet", "parquet"),
+    "arrow": (iter_arrow, "application/vnd.apache.arrow.stream", "arrows"),
+}
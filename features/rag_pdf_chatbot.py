@@ -1,37 +1,207 @@
-from groq import Groq
-import PyPDF2
+from python_scripts.pdf_text import iter_pdf_pages
+from python_scripts.bm25 import BM25Index
+from python_scripts.document_store import get_document_store
+from python_scripts.embeddings import VectorIndex, hybrid_top_k
+from python_scripts.llm_gateway import get_llm_gateway
+from python_scripts.tokens import (
+    CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, chunk_by_tokens, count_tokens, pack_top_chunks, prompt_budget,
+)
 import numpy as np
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
 
-# Configure your Groq API key
-GROQ_API_KEY = os.getenv("GROQ_API_KEY") or "YOUR_GROQ_API_KEY_HERE"
-groq_client = Groq(api_key=GROQ_API_KEY)
+# Uploaded PDFs are kept in the document store, with their chunks and
+# indexes in the store's derived directory for the PDF's content hash; the
+# most recently used RAG_CACHE_DOCS documents are also kept in memory
+RAG_DOCUMENT_KIND = "rag_pdf"
+RAG_CACHE_DOCS = int(os.getenv("RAG_CACHE_DOCS", "32"))
+
+# Chunks are ranked by BM25 fused with local embedding similarity; this is
+# the weight of the embeddings (0: BM25 only, 1: embeddings only)
+RAG_SEMANTIC_WEIGHT = float(os.getenv("RAG_SEMANTIC_WEIGHT", "0.5"))
+
+RAG_MODEL = "mixtral-8x7b-32768"
+RAG_MAX_TOKENS = 512
+# Most tokens of PDF content sent with a question (fewer if the model's
+# context window is smaller); the best-ranked chunks that fit are sent
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "4000"))
+# Documents chunked differently are chunked again when uploaded again
+RAG_CHUNKING = f"tokens:{CHUNK_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+
+RAG_SYSTEM_PROMPT = "You are a helpful AI assistant."
+RAG_PROMPT = (
+    "Use the following PDF content to answer the user's question.\n\n"
+    "PDF Content:\n{context}\n\n"
+    "Question: {question}\n"
+    "Answer:"
+)
 
 def extract_pdf_text(pdf_file):
     """Extracts all text from a PDF file-like object."""
     try:
-        reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text() or ""
-            text += page_text + "\n"
-        return text.strip()
+        return "\n".join(iter_pdf_pages(pdf_file)).strip()
     except Exception as e:
         raise ValueError(f"Failed to extract PDF: {e}")
 
-def chunk_text(text, max_len=1500):
-    """Chunks text into pieces of max_len words for context windowing."""
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), max_len):
-        chunk = " ".join(words[i:i + max_len])
-        chunks.append(chunk)
-    return chunks
+def build_context(chunks, question, budget=RAG_CONTEXT_TOKENS, index=None, vectors=None,
+                  semantic_weight=RAG_SEMANTIC_WEIGHT, token_counts=None):
+    """
+    Packs the chunks most relevant to the question into budget tokens. They
+    are ranked by BM25 (index is the chunks' BM25Index) fused with embedding
+    similarity (vectors, their VectorIndex) by semantic_weight; indexes and
+    token counts not given are computed here. When no chunk matches at all,
+    the first chunks are used. Chunks are joined in document order.
+    """
+    lexical = semantic = None
+    if semantic_weight < 1:
+        lexical = (index or BM25Index.build(chunks)).scores(question)
+    if semantic_weight > 0:
+        semantic = (vectors or VectorIndex.build(chunks)).scores(question)
+    token_counts = token_counts or [count_tokens(chunk) for chunk in chunks]
+    selected = pack_top_chunks(
+        token_counts, lambda k: [chunk for chunk, _ in hybrid_top_k(lexical, semantic, k, semantic_weight)],
+        budget, count_tokens("\n\n"))
+    return "\n\n".join(chunks[chunk] for chunk in selected)
+
+class RagDocument:
+    """An ingested PDF: its chunks, and retrieval state built from them."""
+    __slots__ = ("content_hash", "chunks", "token_counts", "meta", "bm25", "vectors")
+
+    def __init__(self, content_hash, chunks, token_counts, meta, bm25, vectors=None):
+        self.content_hash = content_hash
+        self.chunks = chunks
+        self.token_counts = token_counts
+        self.meta = meta
+        self.bm25 = bm25
+        self.vectors = vectors  # Loaded on the first question when not given
+
+
+_documents = OrderedDict()
+_documents_lock = threading.Lock()
+
+
+def _document_dir(content_hash):
+    if len(content_hash) != 64 or any(c not in "0123456789abcdef" for c in content_hash):
+        raise ValueError("Invalid document hash.")
+    return os.path.join(get_document_store().derived_dir(content_hash), "rag")
+
+
+def _write_json_atomic(path, data):
+    # Written aside and renamed, so readers never see a partial file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def _remember(document):
+    with _documents_lock:
+        _documents[document.content_hash] = document
+        _documents.move_to_end(document.content_hash)
+        while len(_documents) > RAG_CACHE_DOCS:
+            _documents.popitem(last=False)
+    return document
+
+
+def load_document(content_hash):
+    """
+    The ingested document for a PDF with this content hash. Raises KeyError
+    if it was not ingested (or was evicted from the store).
+    """
+    directory = _document_dir(content_hash)
+    with _documents_lock:
+        document = _documents.get(content_hash)
+        if document is not None and os.path.isdir(directory):
+            _documents.move_to_end(content_hash)
+            return document
+        _documents.pop(content_hash, None)
+    try:
+        with open(os.path.join(directory, "chunks.json"), encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise KeyError(content_hash)
+    chunks = data.pop("chunks")
+    token_counts = data.pop("token_counts", None) or [count_tokens(chunk) for chunk in chunks]
+    try:
+        bm25 = BM25Index.load(os.path.join(directory, "bm25.npz"))
+    except (OSError, ValueError, KeyError):
+        # Stored before the index existed, or a damaged file
+        bm25 = _save_index(directory, BM25Index.build(chunks))
+    return _remember(RagDocument(content_hash, chunks, token_counts, data, bm25))
+
+
+def _save_index(directory, bm25):
+    temp_path = os.path.join(directory, f"bm25.{os.getpid()}.{threading.get_ident()}.tmp.npz")
+    bm25.save(temp_path)
+    os.replace(temp_path, os.path.join(directory, "bm25.npz"))
+    return bm25
+
+
+def document_vectors(document):
+    """
+    The document's chunk embeddings: kept with the document in memory,
+    memory-mapped from its directory, or built and saved there.
+    """
+    if document.vectors is None:
+        directory = _document_dir(document.content_hash)
+        try:
+            vectors = VectorIndex.load(directory)
+        except (OSError, ValueError, KeyError):
+            vectors = VectorIndex.build(document.chunks)
+            vectors.save(directory)
+        document.vectors = vectors
+    return document.vectors
+
+
+def ingest_pdf(pdf_file, owner="local", name=""):
+    """
+    Streams a PDF into the document store for owner, then extracts and
+    chunks it (reading the stored file memory-mapped) unless a PDF with the
+    same content was already ingested with the current chunking settings.
+    Returns (StoredDocument, RagDocument, deduplicated); the stored
+    document's doc_id is what answer_from_document takes. Raises
+    QuotaExceeded if the owner's quota is used up.
+    """
+    store = get_document_store()
+    stored, deduplicated = store.put(pdf_file, owner, RAG_DOCUMENT_KIND, name)
+    try:
+        document = load_document(stored.hash)
+        if document.meta.get("chunking") == RAG_CHUNKING:
+            return stored, document, deduplicated
+    except KeyError:
+        pass
+    try:
+        with store.open(stored) as f:
+            pdf_text = extract_pdf_text(f)
+        if not pdf_text:
+            raise ValueError("The PDF appears to have no extractable text.")
+    except ValueError:
+        # Nothing to answer from, so don't keep the upload
+        if not deduplicated:
+            store.delete(stored.doc_id)
+        raise
+    return stored, _ingest_text(stored.hash, stored.size, pdf_text), deduplicated
+
+
+def _ingest_text(content_hash, size, pdf_text):
+    chunks, token_counts = chunk_by_tokens(pdf_text)
+    meta = {"hash": content_hash, "size": size, "characters": len(pdf_text), "chunking": RAG_CHUNKING,
+            "created": time.time()}
+    directory = _document_dir(content_hash)
+    os.makedirs(directory, exist_ok=True)
+    # The index goes first: chunks.json is what marks a document as stored
+    bm25 = _save_index(directory, BM25Index.build(chunks))
+    vectors = None
+    if RAG_SEMANTIC_WEIGHT > 0:
+        vectors = VectorIndex.build(chunks)
+        vectors.save(directory)
+    _write_json_atomic(os.path.join(directory, "chunks.json"),
+                       {**meta, "chunks": chunks, "token_counts": token_counts})
+    return _remember(RagDocument(content_hash, chunks, token_counts, meta, bm25, vectors))
 
-def build_context(chunks, question, max_chunks=3):
-    """Naive retrieval: Select the most relevant chunks for the question."""
-    ranked = sorted(chunks, key=lambda c: sum(1 for w in question.split() if w in c), reverse=True)
-    return "\n\n".join(ranked[:max_chunks])
 
 def answer_from_pdf(pdf_file, question, temperature=0.0):
     """
@@ -44,29 +214,62 @@ def answer_from_pdf(pdf_file, question, temperature=0.0):
         str: Answer from the LLM.
     """
     try:
-        # Extract and chunk PDF text
-        pdf_text = extract_pdf_text(pdf_file)
-        if not pdf_text.strip():
-            return "The PDF appears to have no extractable text."
-        chunks = chunk_text(pdf_text)
-        context = build_context(chunks, question)
-        prompt = (
-            f"Use the following PDF content to answer the user's question.\n\n"
-            f"PDF Content:\n{context}\n\n"
-            f"Question: {question}\n"
-            f"Answer:"
-        )
+        stored, _, _ = ingest_pdf(pdf_file)
+    except ValueError as e:
+        return str(e)
+    except Exception as e:
+        return f"Error generating answer: {str(e)}"
+    return answer_from_document(stored.doc_id, question, temperature)
+
+
+def _answer_request(document, question, temperature):
+    # Chat completion arguments for a question about an ingested document
+    vectors = document_vectors(document) if RAG_SEMANTIC_WEIGHT > 0 else None
+    budget = min(RAG_CONTEXT_TOKENS, prompt_budget(
+        RAG_MODEL, RAG_MAX_TOKENS, RAG_SYSTEM_PROMPT, RAG_PROMPT.format(context="", question=question)))
+    context = build_context(document.chunks, question, budget, index=document.bm25, vectors=vectors,
+                            token_counts=document.token_counts)
+    return {
+        "model": RAG_MODEL,
+        "messages": [
+            {"role": "system", "content": RAG_SYSTEM_PROMPT},
+            {"role": "user", "content": RAG_PROMPT.format(context=context, question=question)}
+        ],
+        "temperature": temperature,
+        "max_tokens": RAG_MAX_TOKENS,
+    }
+
+
+def resolve_document(doc_id, owner=None):
+    """
+    The RagDocument for a stored PDF's doc_id (owned by owner, when given).
+    Raises KeyError for an unknown doc_id, one of another owner, or a PDF
+    that was evicted.
+    """
+    stored = get_document_store().get(doc_id, owner=owner, kind=RAG_DOCUMENT_KIND)
+    return load_document(stored.hash)
+
+
+def answer_from_document(doc_id, question, temperature=0.0, owner=None):
+    """
+    Answers a question from an ingested document (see ingest_pdf), without
+    touching the PDF again. Raises KeyError for an unknown doc_id.
+    """
+    document = resolve_document(doc_id, owner)
+    try:
         # Call Groq LLM API (new OpenAI/Groq v1+ style)
-        response = groq_client.chat.completions.create(
-            model="mixtral-8x7b-32768",
-            messages=[
-                {"role": "system", "content": "You are a helpful AI assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature,
-            max_tokens=512,
-        )
+        response = get_llm_gateway().chat(**_answer_request(document, question, temperature))
         answer = response.choices[0].message.content
         return answer.strip()
     except Exception as e:
-        return f"Error generating answer: {str(e)}"
\ No newline at end of file
+        return f"Error generating answer: {str(e)}"
+
+def stream_answer_from_document(doc_id, question, temperature=0.0, owner=None):
+    """
+    Like answer_from_document, but returns a generator of streamed events
+    (see stream_chat_completion). The document is loaded and the prompt
+    built before this returns, so KeyError for an unknown doc_id is raised
+    here rather than mid-stream.
+    """
+    request = _answer_request(resolve_document(doc_id, owner), question, temperature)
+    return get_llm_gateway().stream(**request)
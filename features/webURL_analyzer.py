@@ -2,11 +2,34 @@ import os
 import requests
 from bs4 import BeautifulSoup
 import json
+import hashlib
+import threading
+from collections import OrderedDict
+from python_scripts.bm25 import BM25Index
+from python_scripts.embeddings import VectorIndex, hybrid_top_k
+from python_scripts.llm_gateway import get_llm_gateway
+from python_scripts.tokens import chunk_document, count_tokens, pack_top_chunks, prompt_budget
 
-try:
-    import groq
-except ImportError:
-    groq = None  # If groq is not installed, Q&A won't work
+# Questions are answered from the chunks of the page that rank best by BM25
+# fused with local embedding similarity (WEB_SEMANTIC_WEIGHT is the weight of
+# the embeddings), as many as fit in WEB_CONTEXT_TOKENS tokens (fewer if the
+# model's context window is smaller). The indexes of the last WEB_CACHE_PAGES
+# pages are kept, so another question about a page only embeds the question.
+WEB_CONTEXT_TOKENS = int(os.getenv("WEB_CONTEXT_TOKENS", "3000"))
+WEB_SEMANTIC_WEIGHT = float(os.getenv("WEB_SEMANTIC_WEIGHT", "0.5"))
+WEB_CACHE_PAGES = int(os.getenv("WEB_CACHE_PAGES", "16"))
+
+_page_indexes = OrderedDict()
+_page_indexes_lock = threading.Lock()
+
+WEB_MAX_TOKENS = 500
+WEB_SYSTEM_PROMPT = "You are a helpful assistant that answers questions based on website content."
+WEB_PROMPT = (
+    "Based on the following website content:\n\n"
+    "{context}\n\n"
+    "Please answer the following question:\n{question}\n\n"
+    "If the answer is not found in the content, say: \"I couldn't find information about that in the website content.\""
+)
 
 def extract_website_content(url):
     """Extract and clean text content from a website URL."""
@@ -31,44 +54,64 @@ def extract_website_content(url):
     except Exception as e:
         raise ValueError(f"Failed to extract content: {str(e)}")
 
-def chunk_text(text, max_length=1500):
-    """Chunk content to fit context window for LLMs."""
-    words = text.split()
-    return [' '.join(words[i:i+max_length]) for i in range(0, len(words), max_length)]
+def _page_index(content):
+    # (chunks, token counts, BM25Index, VectorIndex) of a page's text, cached by its hash
+    key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    with _page_indexes_lock:
+        if key in _page_indexes:
+            _page_indexes.move_to_end(key)
+            return _page_indexes[key]
+    chunks, token_counts = chunk_document(content)
+    vectors = VectorIndex.build(chunks) if WEB_SEMANTIC_WEIGHT > 0 else None
+    entry = (chunks, token_counts, BM25Index.build(chunks), vectors)
+    with _page_indexes_lock:
+        _page_indexes[key] = entry
+        while len(_page_indexes) > WEB_CACHE_PAGES:
+            _page_indexes.popitem(last=False)
+    return entry
+
+def select_context(content, question, budget=WEB_CONTEXT_TOKENS):
+    """
+    The chunks of content most relevant to the question that fit in budget
+    tokens, in page order (the first chunks if none match).
+    """
+    chunks, token_counts, index, vectors = _page_index(content)
+    lexical, semantic = index.scores(question), vectors.scores(question) if vectors else None
+    selected = pack_top_chunks(
+        token_counts, lambda k: [chunk for chunk, _ in hybrid_top_k(lexical, semantic, k, WEB_SEMANTIC_WEIGHT)],
+        budget, count_tokens("\n\n"))
+    return "\n\n".join(chunks[chunk] for chunk in selected)
+
+def _answer_request(question, content, model):
+    # Chat completion arguments for a question about a page's content
+    budget = min(WEB_CONTEXT_TOKENS, prompt_budget(
+        model, WEB_MAX_TOKENS, WEB_SYSTEM_PROMPT, WEB_PROMPT.format(context="", question=question)))
+    prompt = WEB_PROMPT.format(context=select_context(content, question, budget), question=question)
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": WEB_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": WEB_MAX_TOKENS,
+    }
 
-def answer_question_groq(question, content, groq_api_key, model="gemma2-9b-it"):
-    """Ask a question about content using the Groq LLM API."""
-    if not groq:
-        return "Groq library not installed. Q&A unavailable."
-    if not groq_api_key:
+def answer_question_groq(question, content, model="gemma2-9b-it"):
+    """
+    Ask a question about content using the Groq LLM API, through the shared
+    LLM gateway (configured by GROQ_API_KEY).
+    """
+    llm = get_llm_gateway()
+    if not llm.configured:
         return "Groq API key is not configured."
 
-    client = groq.Groq(api_key=groq_api_key)
-    # Choose the most relevant chunk naively; for production, use embedding similarity
-    chunks = chunk_text(content)
-    # Simple: use the largest chunk (or the first chunk) for now
-    context = chunks[0] if chunks else ""
-    prompt = (
-        f"Based on the following website content:\n\n"
-        f"{context}\n\n"
-        f"Please answer the following question:\n{question}\n\n"
-        f"If the answer is not found in the content, say: \"I couldn't find information about that in the website content.\""
-    )
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system",
-                 "content": "You are a helpful assistant that answers questions based on website content."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500
-        )
+        response = llm.chat(**_answer_request(question, content, model))
         return response.choices[0].message.content
     except Exception as e:
         return f"Error from Groq API: {str(e)}"
 
-def analyze(url, question=None, groq_api_key=None, model="gemma2-9b-it"):
+def analyze(url, question=None, model="gemma2-9b-it"):
     """
     Main entry point: extract content and optionally answer a question.
     Returns: dict with keys 'url', 'summary', and optionally 'answer'.
@@ -77,9 +120,24 @@ def analyze(url, question=None, groq_api_key=None, model="gemma2-9b-it"):
         content = extract_website_content(url)
         summary = content[:1000] + ("..." if len(content) > 1000 else "")
         result = {"url": url, "summary": summary}
-        if question and groq_api_key:
-            answer = answer_question_groq(question, content, groq_api_key, model=model)
+        if question and get_llm_gateway().configured:
+            answer = answer_question_groq(question, content, model=model)
             result['answer'] = answer
         return result
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+def stream_analyze(url, question, model="gemma2-9b-it"):
+    """
+    Like analyze with a question, but the answer is streamed: returns
+    (result, events) where result has 'url' and 'summary' and events is a
+    generator of streamed answer events (see stream_chat_completion).
+    Raises ValueError if the page can't be fetched or Q&A is unavailable.
+    """
+    llm = get_llm_gateway()
+    if not llm.configured:
+        raise ValueError("Groq API key is not configured.")
+    content = extract_website_content(url)
+    result = {"url": url, "summary": content[:1000] + ("..." if len(content) > 1000 else "")}
+    request = _answer_request(question, content, model)
+    return result, llm.stream(**request)
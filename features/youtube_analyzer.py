@@ -1,70 +1,62 @@
-import os
+from python_scripts.document_store import get_document_store
 from transcript_extractor.extract_transcript import get_transcript, get_transcript_with_timestamps
-from transcriptQA.groqllm import ask_groq
+from transcriptQA.groqllm import ask_groq, summarize_groq, stream_groq, stream_summary_groq
 
+# Each user's transcripts are kept in the document store as this kind
+TRANSCRIPT_KIND = "transcript"
 
-def extract_and_save_transcript(youtube_url, base_path="temp_files"):
+
+def extract_and_save_transcript(youtube_url, owner="local"):
     """
-    Extracts transcript and transcript with timestamps for a YouTube URL,
-    saves them to files, and returns the best-available transcript.
+    Extracts the transcript of a YouTube URL (timestamped when available),
+    stores it in the document store for owner, and returns it with its
+    doc_id.
     """
     if not youtube_url:
         return {'success': False, 'error': 'No YouTube URL provided'}
 
-    os.makedirs(base_path, exist_ok=True)
-    transcript_file = os.path.join(base_path, "transcript.txt")
-    timestamp_file = os.path.join(base_path, "transcripts_with_timestamps.txt")
     try:
         # Extract normal transcript
         result = get_transcript(youtube_url)
         if not result['success']:
             return {'success': False, 'error': result['error']}
         transcript = result['transcript']
-        with open(transcript_file, "w", encoding="utf-8") as f:
-            f.write(transcript)
         # Try to extract timestamped transcript
         timestamp_result = get_transcript_with_timestamps(youtube_url)
         if timestamp_result['success']:
-            transcript_ts = timestamp_result['transcript']
-            with open(timestamp_file, "w", encoding="utf-8") as f:
-                f.write(transcript_ts)
-            return {'success': True, 'transcript': transcript_ts}
-        else:
-            return {'success': True, 'transcript': transcript}
+            transcript = timestamp_result['transcript']
+        stored, _ = get_document_store().put_bytes(transcript.encode("utf-8"), owner, TRANSCRIPT_KIND,
+                                                   youtube_url)
+        return {'success': True, 'transcript': transcript, 'doc_id': stored.doc_id}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
 
-def load_transcript(base_path="temp_files"):
+def load_transcript(owner="local", doc_id=None):
     """
-    Load the latest transcript (prefer timestamped) from disk if available.
+    Load the owner's transcript with this doc_id, or their latest one, from
+    the document store if available.
     """
-    transcript_file = os.path.join(base_path, "transcript.txt")
-    timestamp_file = os.path.join(base_path, "transcripts_with_timestamps.txt")
+    store = get_document_store()
     try:
-        if os.path.exists(timestamp_file):
-            with open(timestamp_file, "r", encoding="utf-8") as f:
-                content = f.read()
-                if content.strip():
-                    return content
-        if os.path.exists(transcript_file):
-            with open(transcript_file, "r", encoding="utf-8") as f:
-                content = f.read()
-                if content.strip():
-                    return content
-        return None
-    except Exception:
+        if doc_id:
+            stored = store.get(doc_id, owner=owner, kind=TRANSCRIPT_KIND)
+        else:
+            stored = store.latest(owner, TRANSCRIPT_KIND)
+        content = store.read_text(stored)
+        return content if content.strip() else None
+    except (KeyError, ValueError):
         return None
 
 
-def ask_question_over_transcript(question, transcript_text=None, base_path="temp_files", client=None):
+def ask_question_over_transcript(question, transcript_text=None, owner="local", doc_id=None, client=None):
     """
     Answers a question based on the provided or saved transcript using Groq/OpenAI-compatible API.
     """
     if not question:
         return {'success': False, 'error': 'No question provided'}
     if not transcript_text:
-        transcript_text = load_transcript(base_path)
+        transcript_text = load_transcript(owner, doc_id)
     if not transcript_text:
         return {'success': False, 'error': 'No transcript found.'}
     try:
@@ -81,11 +73,30 @@ def summarize_transcript(transcript_text, client=None):
     if not transcript_text:
         return {'success': False, 'error': 'No transcript text provided'}
     try:
-        summary_prompt = (
-            "Please provide a concise summary of the following YouTube video transcript:\n\n"
-            f"{transcript_text}\n\nSummary:"
-        )
-        answer = ask_groq(summary_prompt, client=client, transcript_text=transcript_text)
+        answer = summarize_groq(transcript_text, client=client)
         return {'success': True, 'summary': answer}
     except Exception as e:
-        return {'success': False, 'error': str(e)}
\ No newline at end of file
+        return {'success': False, 'error': str(e)}
+
+def stream_question_over_transcript(question, transcript_text=None, owner="local", doc_id=None, client=None):
+    """
+    Like ask_question_over_transcript, but returns a generator of streamed
+    answer events. Raises ValueError when there is no question or transcript.
+    """
+    if not question:
+        raise ValueError('No question provided')
+    if not transcript_text:
+        transcript_text = load_transcript(owner, doc_id)
+    if not transcript_text:
+        raise ValueError('No transcript found.')
+    return stream_groq(question, transcript_text, client)
+
+
+def stream_summary(transcript_text, client=None):
+    """
+    Like summarize_transcript, but returns a generator of streamed events.
+    Raises ValueError when there is no transcript.
+    """
+    if not transcript_text:
+        raise ValueError('No transcript text provided')
+    return stream_summary_groq(transcript_text, client)
@@ -1,5 +1,7 @@
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 
 
 def cosine_similarity_tfidf(doc1, doc2):
@@ -11,3 +13,45 @@ def cosine_similarity_count(doc1, doc2):
     vectorizer = CountVectorizer()
     count_matrix = vectorizer.fit_transform([doc1, doc2])
     return cosine_similarity(count_matrix[0], count_matrix[1])[0][0]
+
+
+_CORPUS_VECTORIZERS = {
+    "tfidf": TfidfVectorizer,
+    "count": CountVectorizer,
+}
+
+
+def cosine_rows(docs, weighting="tfidf"):
+    """
+    The documents vectorized together (so TF-IDF weights use the IDF of the
+    whole corpus) as L2-normalized sparse CSR rows, whose dot products are
+    the cosine similarities. None if the corpus has no vocabulary (e.g.
+    every document is blank), in which case nothing is similar.
+    """
+    if weighting not in _CORPUS_VECTORIZERS:
+        raise ValueError(f"Unknown weighting: {weighting}")
+    try:
+        matrix = _CORPUS_VECTORIZERS[weighting]().fit_transform(docs)
+    except ValueError:
+        return None
+    return normalize(matrix, norm="l2", copy=False).tocsr()
+
+
+def cosine_similarity_pairs(rows, pairs, block_size=None):
+    """
+    Cosine similarity of each (i, j) in pairs, from cosine_rows. Scores are
+    computed block_size pairs at a time (one sparse element-wise product of
+    the gathered rows per block), so memory grows with the block and the
+    documents' nonzeros, never with the square of the corpus.
+    Returns a float array aligned with pairs.
+    """
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    scores = np.zeros(len(pairs))
+    if rows is None:
+        return scores
+    block_size = block_size or len(pairs) or 1
+    for start in range(0, len(pairs), block_size):
+        block = pairs[start:start + block_size]
+        products = rows[block[:, 0]].multiply(rows[block[:, 1]])
+        scores[start:start + len(block)] = np.asarray(products.sum(axis=1)).ravel()
+    return scores
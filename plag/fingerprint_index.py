@@ -0,0 +1,123 @@
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+
+from plag.winnowing import fingerprint, normalize_whitespace
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    n_hashes INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    hash INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (hash, doc_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS fingerprints_doc ON fingerprints(doc_id);
+"""
+
+
+class FingerprintIndex:
+    """
+    Persistent reference corpus of winnowing fingerprints stored in SQLite.
+
+    Fingerprints are kept in an inverted index (hash -> documents), so
+    checking a document only touches the postings of its own fingerprints
+    rather than scanning the corpus. Documents are identified by name and
+    can be added, replaced and removed incrementally.
+    """
+
+    def __init__(self, path, k=25, window=20):
+        self.path = path
+        self.k = k
+        self.window = window
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+            for key, value in (("k", k), ("window", window)):
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+                stored = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+                if int(stored) != value:
+                    raise ValueError(f"Index at {path} was built with {key}={stored}, not {value}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _fingerprint(self, text):
+        hashes, positions = fingerprint(normalize_whitespace(text), self.k, self.window)
+        # SQLite integers are signed 64-bit
+        return hashes.view(np.int64), positions
+
+    def add(self, name, text):
+        """Adds a document (a preprocess_text output), replacing any with the same name."""
+        hashes, positions = self._fingerprint(text)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM documents WHERE name = ?", (name,))
+            doc_id = conn.execute(
+                "INSERT INTO documents (name, n_hashes, added_at) VALUES (?, ?, ?)",
+                (name, int(np.unique(hashes).size), time.time()),
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO fingerprints (hash, doc_id, position) VALUES (?, ?, ?)",
+                ((h, doc_id, p) for h, p in zip(hashes.tolist(), positions.tolist())),
+            )
+        return doc_id
+
+    def remove(self, name):
+        """Removes a document by name. Returns False if it was not indexed."""
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("DELETE FROM documents WHERE name = ?", (name,)).rowcount > 0
+
+    def documents(self):
+        """Names of the indexed documents, oldest first."""
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM documents ORDER BY added_at, id")]
+
+    def check(self, text, limit=10, min_shared=1):
+        """
+        Finds the indexed documents sharing the most fingerprints with text.
+        Returns a list of dicts, best match first, with the shared fingerprint
+        count, containment (share of the query's fingerprints found in the
+        document) and resemblance (Jaccard of the two fingerprint sets).
+        """
+        hashes, _ = self._fingerprint(text)
+        query = np.unique(hashes)
+        if query.size == 0:
+            return []
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TEMP TABLE query_hashes (hash INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT INTO query_hashes (hash) VALUES (?)", ((h,) for h in query.tolist()))
+            rows = conn.execute(
+                """
+                SELECT d.name, COUNT(DISTINCT f.hash) AS shared, d.n_hashes
+                FROM query_hashes q
+                JOIN fingerprints f ON f.hash = q.hash
+                JOIN documents d ON d.id = f.doc_id
+                GROUP BY f.doc_id
+                HAVING shared >= ?
+                ORDER BY shared DESC, d.name
+                LIMIT ?
+                """,
+                (min_shared, limit),
+            ).fetchall()
+        results = []
+        for name, shared, n_hashes in rows:
+            results.append({
+                "Document": name,
+                "Shared Fingerprints": shared,
+                "Containment (%)": round(shared / query.size * 100, 2),
+                "Resemblance (%)": round(shared / (query.size + n_hashes - shared) * 100, 2),
+            })
+        return results
@@ -1,6 +1,19 @@
+import numpy as np
+
+
 def jaccard_similarity(doc1, doc2):
     words_doc1 = set(doc1.split())
     words_doc2 = set(doc2.split())
     intersection = words_doc1.intersection(words_doc2)
     union = words_doc1.union(words_doc2)
-    return len(intersection) / len(union)
\ No newline at end of file
+    return len(intersection) / len(union)
+
+
+def jaccard_similarity_hashes(hashes1, hashes2):
+    """
+    Jaccard similarity of two sets given as sorted arrays of distinct hashes
+    (see plag.profile). Returns 0 when both sets are empty.
+    """
+    intersection = np.intersect1d(hashes1, hashes2, assume_unique=True).size
+    union = hashes1.size + hashes2.size - intersection
+    return intersection / union if union != 0 else 0
@@ -1,16 +1,86 @@
 # Longest Common Subsequence (LCS)
-def lcs(X, Y):
+import math
+from collections import Counter
+
+
+def tokenize(text, granularity="char"):
+    """Splits text into LCS tokens: single characters or whitespace-separated words."""
+    if granularity == "char":
+        return text
+    if granularity == "word":
+        return text.split()
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def lcs_upper_bound(X, Y):
+    """
+    Cheap upper bound on the LCS length: a common subsequence can use each
+    token at most as often as it occurs in the rarer of the two sequences.
+    """
+    counts_x = Counter(X)
+    counts_y = Counter(Y)
+    if len(counts_x) > len(counts_y):
+        counts_x, counts_y = counts_y, counts_x
+    return sum(min(count, counts_y[token]) for token, count in counts_x.items())
+
+
+def lcs_length(X, Y, min_length=None):
+    """
+    Length of the longest common subsequence of two token sequences.
+
+    Uses the bit-parallel row update of Allison-Dix / Hyyro: the DP row is
+    kept as the bits of one integer, so memory is linear in len(X) and each
+    token of Y costs a handful of big-integer operations instead of a
+    Python loop over the row.
+
+    If min_length is given and the LCS provably cannot reach it, the scan
+    stops early and an upper bound below min_length is returned instead.
+    """
+    if len(X) < len(Y):
+        X, Y = Y, X
     m = len(X)
     n = len(Y)
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
-    
-    for i in range(m + 1):
-        for j in range(n + 1):
-            if i == 0 or j == 0:
-                dp[i][j] = 0
-            elif X[i - 1] == Y[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1] + 1
-            else:
-                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
-    
-    return dp[m][n] / max(m, n)
\ No newline at end of file
+    if n == 0:
+        return 0
+
+    # Match masks: bit k of match[token] is set when X[k] == token.
+    match = {}
+    for k, token in enumerate(X):
+        match[token] = match.get(token, 0) | (1 << k)
+
+    mask = (1 << m) - 1
+    row = mask
+    for processed, token in enumerate(Y, start=1):
+        matches = match.get(token)
+        if matches:
+            u = row & matches
+            row = ((row + u) | (row - u)) & mask
+        if min_length is not None and processed % 64 == 0:
+            # Each remaining token of Y can extend the LCS by at most one.
+            bound = m - row.bit_count() + (n - processed)
+            if bound < min_length:
+                return bound
+    return m - row.bit_count()
+
+
+def lcs(X, Y, granularity="char", min_score=None):
+    """
+    Normalized LCS similarity: LCS length divided by the longer sequence.
+    granularity selects character or word tokens. If min_score is given and
+    the pair cannot reach it, an upper bound below min_score is returned
+    without finishing the scan.
+    """
+    X = tokenize(X, granularity)
+    Y = tokenize(Y, granularity)
+    longest = max(len(X), len(Y))
+    if longest == 0:
+        return 0.0
+
+    min_length = None
+    if min_score is not None:
+        bound = lcs_upper_bound(X, Y)
+        if bound / longest < min_score:
+            return bound / longest
+        # Smallest integer length whose score reaches min_score
+        min_length = math.ceil(min_score * longest)
+    return lcs_length(X, Y, min_length=min_length) / longest
@@ -1,16 +1,85 @@
-from datasketch import MinHash
+from functools import lru_cache
 
+import numpy as np
+from datasketch import MinHash, MinHashLSH
+from datasketch.hashfunc import sha1_hash32
 
-def lsh_similarity(doc1, doc2, num_perm=128):
-    doc1_set = set(doc1.split())
-    doc2_set = set(doc2.split())
+# Same constants datasketch uses, so signatures are interchangeable with MinHash
+_mersenne_prime = np.uint64((1 << 61) - 1)
+_max_hash = np.uint64((1 << 32) - 1)
+_HASH_CHUNK = 4096
+
+
+@lru_cache(maxsize=None)
+def _permutations(num_perm, seed):
+    return MinHash(num_perm=num_perm, seed=seed).permutations
+
+
+def token_hashes(tokens):
+    """32-bit SHA1 hashes of the distinct tokens, as datasketch computes them."""
+    return np.fromiter(
+        (sha1_hash32(token.encode('utf8')) for token in set(tokens)), dtype=np.uint64
+    )
+
+
+def minhash_signature(tokens, num_perm=128, seed=1, hashes=None):
+    """
+    MinHash signature of a token set, computed for all tokens at once with NumPy.
+    Matches what datasketch.MinHash produces after updating with every token.
+    Precomputed token_hashes can be passed as hashes.
+    """
+    if hashes is None:
+        hashes = token_hashes(tokens)
+    a, b = _permutations(num_perm, seed)
+    signature = np.full(num_perm, _max_hash, dtype=np.uint64)
+    # Chunked so the (tokens x num_perm) intermediate stays a few MB
+    for start in range(0, hashes.size, _HASH_CHUNK):
+        chunk = hashes[start:start + _HASH_CHUNK, np.newaxis]
+        permuted = (chunk * a + b) % _mersenne_prime & _max_hash
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature
 
-    minhash1 = MinHash(num_perm=num_perm)
-    minhash2 = MinHash(num_perm=num_perm)
 
-    for word in doc1_set:
-        minhash1.update(word.encode('utf8'))
-    for word in doc2_set:
-        minhash2.update(word.encode('utf8'))
+def signature_similarity(signature1, signature2):
+    """Estimated Jaccard similarity: the fraction of equal signature slots."""
+    return np.count_nonzero(signature1 == signature2) / len(signature1)
 
-    return minhash1.jaccard(minhash2)
\ No newline at end of file
+
+@lru_cache(maxsize=256)
+def lsh_threshold_supported(threshold, num_perm=128):
+    """
+    Whether a banded MinHashLSH index can be built for threshold: near 1
+    (above about 0.98 with 128 permutations) there are too few bands.
+    """
+    try:
+        MinHashLSH(threshold=threshold, num_perm=num_perm)
+    except ValueError:
+        return False
+    return True
+
+
+def lsh_candidate_pairs(signatures, threshold=0.5, num_perm=128, seed=1):
+    """
+    Inserts one signature per document into a banded MinHashLSH index and
+    returns the sorted (i, j) pairs, i < j, that share at least one band.
+    Pairs with an estimated Jaccard well below threshold are never returned.
+    """
+    index = MinHashLSH(threshold=threshold, num_perm=num_perm)
+    minhashes = [
+        MinHash(num_perm=num_perm, seed=seed, hashvalues=signature)
+        for signature in signatures
+    ]
+    for key, minhash in enumerate(minhashes):
+        index.insert(key, minhash)
+    pairs = set()
+    for key, minhash in enumerate(minhashes):
+        for other in index.query(minhash):
+            if other != key:
+                pairs.add((min(key, other), max(key, other)))
+    return sorted(pairs)
+
+
+def lsh_similarity(doc1, doc2, num_perm=128):
+    signature1 = minhash_signature(doc1.split(), num_perm=num_perm)
+    signature2 = minhash_signature(doc2.split(), num_perm=num_perm)
+    return signature_similarity(signature1, signature2)
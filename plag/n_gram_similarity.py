@@ -1,3 +1,11 @@
+import numpy as np
+
+# Multiplier for rolling n-gram hashes. For n <= 3 a 21-bit shift packs the
+# code points without loss; longer n-grams use an odd 64-bit multiplier.
+_PACK_BASE = np.uint64(1 << 21)
+_HASH_BASE = np.uint64(0x9E3779B97F4A7C15)
+
+
 # N-Gram Similarity
 def n_gram_similarity(doc1, doc2, n=3):
     def get_ngrams(text, n):
@@ -9,4 +17,25 @@ def n_gram_similarity(doc1, doc2, n=3):
     intersection = len(ngrams1.intersection(ngrams2))
     union = len(ngrams1.union(ngrams2))
 
-    return intersection / union if union != 0 else 0
\ No newline at end of file
+    return intersection / union if union != 0 else 0
+
+
+def char_kgram_hashes(text, n=3):
+    """
+    64-bit hash of the character n-gram starting at every position of text,
+    computed with NumPy instead of building one string per n-gram.
+    """
+    code_points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    count = code_points.size - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    base = _PACK_BASE if n <= 3 else _HASH_BASE
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(n):
+        hashes = hashes * base + code_points[offset:offset + count]
+    return hashes
+
+
+def char_ngram_hashes(text, n=3):
+    """Sorted array of the distinct hashes of the character n-grams of text."""
+    return np.unique(char_kgram_hashes(text, n))
@@ -0,0 +1,58 @@
+# Matched-passage localization by winnowing fingerprint alignment
+import numpy as np
+
+
+def match_fingerprints(hashes1, positions1, hashes2, positions2, max_occurrences=8):
+    """
+    Joins the fingerprints of two documents on their hash with a sort and
+    binary search. Hashes occurring more than max_occurrences times in either
+    document (boilerplate, repeated phrases) are ignored.
+    Returns the matched (position in doc 1, position in doc 2) arrays.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if hashes1.size == 0 or hashes2.size == 0:
+        return empty, empty
+    order = np.argsort(hashes2, kind="stable")
+    sorted_hashes = hashes2[order]
+    left = np.searchsorted(sorted_hashes, hashes1, side="left")
+    counts = np.searchsorted(sorted_hashes, hashes1, side="right") - left
+
+    _, inverse, counts1 = np.unique(hashes1, return_inverse=True, return_counts=True)
+    keep = (counts > 0) & (counts <= max_occurrences) & (counts1[inverse] <= max_occurrences)
+    left, counts = left[keep], counts[keep]
+    if counts.sum() == 0:
+        return empty, empty
+
+    # Expand every kept fingerprint of doc 1 into one match per occurrence in doc 2
+    matched1 = np.repeat(positions1[keep], counts)
+    starts = np.repeat(left, counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    matched2 = positions2[order[starts + within]]
+    return matched1, matched2
+
+
+def merge_matches(matched1, matched2, k, gap=None, min_length=None):
+    """
+    Merges k-gram matches into passages. Matches are visited in doc 1 order
+    and extend an open passage when they continue it (within gap characters)
+    in both documents, so small edits inside a copied passage don't split it.
+    Returns sorted [start1, end1, start2, end2] lists in the fingerprinted
+    text's coordinates, dropping passages shorter than min_length.
+    """
+    gap = k if gap is None else gap
+    min_length = 2 * k if min_length is None else min_length
+    passages = []
+    active = []
+    for p1, p2 in sorted(zip(matched1.tolist(), matched2.tolist())):
+        active = [span for span in active if span[1] + gap >= p1]
+        for span in active:
+            if span[2] - gap <= p2 <= span[3] + gap:
+                span[1] = max(span[1], p1 + k)
+                span[2] = min(span[2], p2)
+                span[3] = max(span[3], p2 + k)
+                break
+        else:
+            span = [p1, p1 + k, p2, p2 + k]
+            active.append(span)
+            passages.append(span)
+    return [span for span in passages if span[1] - span[0] >= min_length]
@@ -0,0 +1,47 @@
+import hashlib
+
+import numpy as np
+
+from plag.lsh import minhash_signature
+from plag.n_gram_similarity import char_ngram_hashes
+
+_LOW_32_BITS = np.uint64((1 << 32) - 1)
+
+
+class DocumentProfile:
+    """
+    Features of one document shared by the set-based metrics, built once per
+    document instead of once per pair.
+
+    tokens: sorted distinct 64-bit hashes of the whitespace-separated words
+    ngrams: sorted distinct 64-bit hashes of the character n-grams
+    signature: MinHash signature of the word set
+    """
+    __slots__ = ("tokens", "ngrams", "signature")
+
+    def __init__(self, tokens, ngrams, signature):
+        self.tokens = tokens
+        self.ngrams = ngrams
+        self.signature = signature
+
+
+def hash_tokens(tokens):
+    """
+    Sorted distinct 64-bit hashes of the given tokens. The hash is the first
+    8 bytes of the token's SHA1, so its low 32 bits are exactly datasketch's
+    sha1_hash32 and the same array also feeds the MinHash signature.
+    """
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.sha1(token.encode('utf8')).digest()[:8], 'little')
+         for token in set(tokens)),
+        dtype=np.uint64,
+    )
+    hashes.sort()
+    return hashes
+
+
+def build_profile(text, n=3, num_perm=128):
+    """Builds the DocumentProfile of a preprocessed text."""
+    tokens = hash_tokens(text.split())
+    signature = minhash_signature(None, num_perm=num_perm, hashes=tokens & _LOW_32_BITS)
+    return DocumentProfile(tokens, char_ngram_hashes(text, n), signature)
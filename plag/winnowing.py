@@ -0,0 +1,34 @@
+# Winnowing fingerprints (Schleimer, Wilkerson & Aiken, 2003)
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from plag.n_gram_similarity import char_kgram_hashes
+
+
+def normalize_whitespace(text):
+    """Collapses whitespace runs so layout changes don't alter the k-grams."""
+    return " ".join(text.split())
+
+
+def winnow(hashes, window=4):
+    """
+    Selects the minimum hash of every window of consecutive k-gram hashes
+    (rightmost on ties), recording each selected position once.
+    Returns (fingerprint hashes, positions) as NumPy arrays.
+    """
+    if hashes.size == 0:
+        return hashes, np.empty(0, dtype=np.int64)
+    window = min(window, hashes.size)
+    windows = sliding_window_view(hashes, window)
+    rightmost = windows[:, ::-1].argmin(axis=1)
+    positions = np.unique(np.arange(windows.shape[0]) + window - 1 - rightmost)
+    return hashes[positions], positions
+
+
+def fingerprint(text, k=25, window=20):
+    """
+    Winnowing fingerprints of text's character k-grams. Any shared passage of
+    at least k + window - 1 characters is guaranteed to share a fingerprint.
+    Positions are character offsets into text.
+    """
+    return winnow(char_kgram_hashes(text, k), window)
@@ -0,0 +1,98 @@
+import heapq
+import re
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text, stopwords=ENGLISH_STOP_WORDS):
+    """Lowercased word tokens of text, without stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in stopwords]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of passages, stored as an inverted index in
+    CSR form: the postings (passage, term frequency) of term t are
+    passages[indptr[t]:indptr[t + 1]]. A query only touches the postings of
+    its own terms, not every passage.
+    """
+
+    def __init__(self, terms, indptr, passages, frequencies, lengths, k1=1.5, b=0.75):
+        self.terms = {term: row for row, term in enumerate(terms)}
+        self.indptr = indptr
+        self.passages = passages
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        n = len(lengths)
+        df = np.diff(indptr)
+        # Non-negative IDF (Lucene's), so very common terms never lower a score
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        average = lengths.mean() if n else 0.0
+        self.norms = k1 * (1 - b + b * lengths / average) if average else np.full(n, k1)
+
+    @classmethod
+    def build(cls, texts, **params):
+        postings = {}
+        lengths = np.zeros(len(texts), dtype=np.float64)
+        for passage, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[passage] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((passage, count))
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(postings[term]) for term in terms])
+        flat = [posting for term in terms for posting in postings[term]]
+        passages = np.array([passage for passage, _ in flat], dtype=np.int32)
+        frequencies = np.array([count for _, count in flat], dtype=np.float32)
+        return cls(terms, indptr, passages, frequencies, lengths, **params)
+
+    def scores(self, query):
+        """BM25 score of every passage for query (0 where no query term occurs)."""
+        scores = np.zeros(len(self.lengths), dtype=np.float64)
+        for token in set(tokenize(query)):
+            row = self.terms.get(token)
+            if row is None:
+                continue
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            passages = self.passages[start:stop]
+            tf = self.frequencies[start:stop]
+            scores[passages] += self.idf[row] * tf * (self.k1 + 1) / (tf + self.norms[passages])
+        return scores
+
+    def top_k(self, query, k=3):
+        """[(passage, score)] of the k best passages with a positive score, best first."""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores)
+        best = heapq.nlargest(k, zip(scores[matched].tolist(), (-matched).tolist()))
+        return [(-negative, score) for score, negative in best]
+
+    def save(self, path):
+        # The vocabulary as one UTF-8 blob and the end offset of each term:
+        # a fixed-width string array would pad every term to the longest one
+        encoded = [term.encode("utf-8") for term in sorted(self.terms, key=self.terms.get)]
+        term_ends = np.cumsum([len(term) for term in encoded], dtype=np.int64)
+        np.savez(path, term_bytes=np.frombuffer(b"".join(encoded), dtype=np.uint8), term_ends=term_ends,
+                 indptr=self.indptr, passages=self.passages, frequencies=self.frequencies,
+                 lengths=self.lengths, params=np.array([self.k1, self.b]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            k1, b = data["params"].tolist()
+            if "term_bytes" in data.files:
+                blob = data["term_bytes"].tobytes()
+                ends = data["term_ends"].tolist()
+                terms = [blob[start:end].decode("utf-8") for start, end in zip([0] + ends, ends)]
+            else:
+                terms = data["terms"].tolist()  # Saved by older versions
+            return cls(terms, data["indptr"], data["passages"], data["frequencies"],
+                       data["lengths"], k1=k1, b=b)
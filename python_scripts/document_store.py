@@ -0,0 +1,380 @@
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing
+
+# Uploaded documents (PDFs, transcripts, ...) live here: file contents once
+# per SHA-256 under blobs/, an SQLite index of the documents pointing at
+# them, and data derived from a blob (extracted chunks, indexes) under
+# derived/, deleted with it.
+DOC_STORE_DIR = os.getenv("DOC_STORE_DIR", "document_store")
+# Total stored bytes, kept by evicting least recently used documents
+DOC_STORE_MAX_BYTES = int(os.getenv("DOC_STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Documents not used for DOC_STORE_TTL seconds expire (0: never)
+DOC_STORE_TTL = float(os.getenv("DOC_STORE_TTL", str(24 * 3600)))
+# Bytes of documents one user may have stored at a time (0: no limit)
+DOC_STORE_USER_QUOTA = int(os.getenv("DOC_STORE_USER_QUOTA", str(200 * 1024 ** 2)))
+# Seconds between background eviction passes (0: no background thread)
+DOC_STORE_EVICT_INTERVAL = float(os.getenv("DOC_STORE_EVICT_INTERVAL", "300"))
+# Documents belong to the client address, or to the user an authenticating
+# proxy names in X-User-Id. The header is honoured for every request with
+# TRUST_USER_HEADER=1, else only for requests from the TRUSTED_PROXIES
+# addresses (comma-separated), whose X-Forwarded-For also gives the client.
+TRUST_USER_HEADER = os.getenv("TRUST_USER_HEADER", "0") != "0"
+TRUSTED_PROXIES = frozenset(address.strip() for address in os.getenv("TRUSTED_PROXIES", "").split(",")
+                            if address.strip())
+
+WRITE_CHUNK_BYTES = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_owner ON documents(owner, kind, hash);
+CREATE INDEX IF NOT EXISTS documents_hash ON documents(hash);
+CREATE INDEX IF NOT EXISTS documents_accessed ON documents(accessed_at);
+"""
+
+_COLUMNS = "doc_id, owner, kind, name, hash, size, created_at, accessed_at"
+
+
+class QuotaExceeded(ValueError):
+    """Storing a document would take its owner over the quota."""
+
+
+class StoredDocument:
+    """One stored document: who uploaded it, what it is, and its content hash."""
+    __slots__ = ("doc_id", "owner", "kind", "name", "hash", "size", "created_at", "accessed_at")
+
+    def __init__(self, doc_id, owner, kind, name, hash, size, created_at, accessed_at):
+        self.doc_id = doc_id
+        self.owner = owner
+        self.kind = kind
+        self.name = name
+        self.hash = hash
+        self.size = size
+        self.created_at = created_at
+        self.accessed_at = accessed_at
+
+    def to_dict(self):
+        return {"doc_id": self.doc_id, "kind": self.kind, "name": self.name, "size": self.size,
+                "created_at": self.created_at}
+
+
+class MappedFile(io.RawIOBase):
+    """
+    A read-only file object over a memory-mapped file: reads are served from
+    the mapping, so a large document is paged in as it is read instead of
+    being loaded into memory. Also usable as bytes via .buffer.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # mmap can't map an empty file
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.buffer = memoryview(self._map) if self._map is not None else memoryview(b"")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        data = self.buffer[self._position:self._position + len(target)]
+        target[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self.buffer)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self.buffer.release()
+            if self._map is not None:
+                self._map.close()
+        super().close()
+
+
+class DocumentStore:
+    """
+    Disk store of uploaded documents with opaque IDs. Contents are
+    deduplicated by SHA-256 (one file per distinct content; a user
+    uploading the same file again gets their existing document back),
+    written to disk as they are streamed in, bounded by per-user quotas,
+    and evicted when unused for the TTL or, least recently used first, when
+    the store outgrows max_bytes.
+    """
+
+    def __init__(self, root=DOC_STORE_DIR, max_bytes=DOC_STORE_MAX_BYTES, ttl=DOC_STORE_TTL,
+                 user_quota=DOC_STORE_USER_QUOTA):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.user_quota = user_quota
+        self._lock = threading.Lock()
+        self._evictor = None
+        self._stop = threading.Event()
+        for name in ("blobs", "derived", "tmp"):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.root, "blobs", content_hash[:2], content_hash)
+
+    def derived_dir(self, content_hash):
+        """Directory for data derived from a blob; removed when the blob is."""
+        return os.path.join(self.root, "derived", content_hash)
+
+    def put(self, stream, owner, kind, name=""):
+        """
+        Stores the contents of a binary file-like object, copying it to disk
+        in chunks while hashing it. Returns (StoredDocument, deduplicated),
+        deduplicated being True when the owner already had this content
+        stored as this kind. Raises QuotaExceeded (and stores nothing) if it
+        would take the owner over their quota; copying stops as soon as the
+        document alone is larger than the quota.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(WRITE_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if self.user_quota and size > self.user_quota:
+                        raise self._quota_exceeded()
+                    digest.update(chunk)
+                    f.write(chunk)
+            return self._add(temp_path, digest.hexdigest(), size, owner, kind, name)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _quota_exceeded(self):
+        return QuotaExceeded(f"Storage quota of {self.user_quota // (1024 * 1024)} MB exceeded; "
+                             "older documents are removed after a while.")
+
+    def put_bytes(self, data, owner, kind, name=""):
+        return self.put(io.BytesIO(data), owner, kind, name)
+
+    def _add(self, temp_path, content_hash, size, owner, kind, name):
+        now = time.time()
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM documents WHERE owner = ? AND kind = ? AND hash = ?",
+                (owner, kind, content_hash),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE documents SET accessed_at = ? WHERE doc_id = ?", (now, row[0]))
+                return StoredDocument(*row[:-1], now), True
+            used = conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents WHERE owner = ?",
+                                (owner,)).fetchone()[0]
+            if self.user_quota and used + size > self.user_quota:
+                raise self._quota_exceeded()
+            path = self.blob_path(content_hash)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+            conn.execute("INSERT OR IGNORE INTO blobs (hash, size, created_at) VALUES (?, ?, ?)",
+                         (content_hash, size, now))
+            document = StoredDocument(uuid.uuid4().hex, owner, kind, name, content_hash, size, now, now)
+            conn.execute(f"INSERT INTO documents ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (document.doc_id, owner, kind, name, content_hash, size, now, now))
+        return document, False
+
+    def get(self, doc_id, owner=None, kind=None):
+        """
+        The document with this ID (and owner and kind, when given), marked
+        as used. Raises KeyError if there is none.
+        """
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(f"SELECT {_COLUMNS} FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if (row is None or (owner is not None and row[1] != owner)
+                    or (kind is not None and row[2] != kind)):
+                raise KeyError(doc_id)
+            now = time.time()
+            conn.execute("UPDATE documents SET accessed_at = ? WHERE doc_id = ?", (now, doc_id))
+        return StoredDocument(*row[:-1], now)
+
+    def latest(self, owner, kind):
+        """The owner's most recently used document of this kind. Raises KeyError if there is none."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT doc_id FROM documents WHERE owner = ? AND kind = ? ORDER BY accessed_at DESC LIMIT 1",
+                (owner, kind),
+            ).fetchone()
+        if row is None:
+            raise KeyError((owner, kind))
+        return self.get(row[0])
+
+    def open(self, document):
+        """The document's contents as a memory-mapped MappedFile (close it when done)."""
+        try:
+            return MappedFile(self.blob_path(document.hash))
+        except FileNotFoundError:
+            raise KeyError(document.doc_id)
+
+    def read_text(self, document):
+        with self.open(document) as f:
+            return f.buffer.tobytes().decode("utf-8")
+
+    def delete(self, doc_id):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._remove_unreferenced(conn)
+
+    def usage(self, owner):
+        """Bytes of documents the owner has stored."""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents WHERE owner = ?",
+                                (owner,)).fetchone()[0]
+
+    def evict(self):
+        """
+        Removes expired documents, then least recently used ones until the
+        stored blobs fit in max_bytes, then blobs (and their derived data)
+        no document refers to any more. Returns the number of documents removed.
+        """
+        now = time.time()
+        removed = 0
+        with self._lock, closing(self._connect()) as conn, conn:
+            if self.ttl:
+                removed += conn.execute("DELETE FROM documents WHERE accessed_at < ?",
+                                        (now - self.ttl,)).rowcount
+            self._remove_unreferenced(conn)
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total > self.max_bytes:
+                # Down to 90% of the budget, so the next upload doesn't evict again
+                excess = total - int(self.max_bytes * 0.9)
+                victims = []
+                for doc_id, content_hash, size in conn.execute(
+                        "SELECT d.doc_id, d.hash, b.size FROM documents d JOIN blobs b ON b.hash = d.hash "
+                        "ORDER BY d.accessed_at"):
+                    if excess <= 0:
+                        break
+                    victims.append((doc_id,))
+                    # A blob is only freed with its last document; counting it
+                    # per document can evict a little more than needed
+                    excess -= size
+                conn.executemany("DELETE FROM documents WHERE doc_id = ?", victims)
+                removed += len(victims)
+                self._remove_unreferenced(conn)
+        self._remove_stale_temp_files(now)
+        return removed
+
+    def _remove_unreferenced(self, conn):
+        orphans = [row[0] for row in conn.execute(
+            "SELECT hash FROM blobs WHERE hash NOT IN (SELECT hash FROM documents)")]
+        for content_hash in orphans:
+            try:
+                os.remove(self.blob_path(content_hash))
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(self.derived_dir(content_hash), ignore_errors=True)
+        conn.executemany("DELETE FROM blobs WHERE hash = ?", [(h,) for h in orphans])
+
+    def _remove_stale_temp_files(self, now, max_age=3600):
+        # Left behind by writes interrupted by a crash
+        directory = os.path.join(self.root, "tmp")
+        for entry in os.scandir(directory):
+            try:
+                if entry.stat().st_mtime < now - max_age:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def start_evictor(self, interval=DOC_STORE_EVICT_INTERVAL):
+        """Runs evict() every interval seconds in a daemon thread."""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.evict()
+                except Exception:
+                    pass  # Tried again next interval
+        if interval and self._evictor is None:
+            self._evictor = threading.Thread(target=run, name="document-store-evictor", daemon=True)
+            self._evictor.start()
+
+    def stop_evictor(self):
+        self._stop.set()
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            documents, users = conn.execute("SELECT COUNT(*), COUNT(DISTINCT owner) FROM documents").fetchone()
+            blobs, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"documents": documents, "users": users, "blobs": blobs, "bytes": size,
+                "max_bytes": self.max_bytes, "ttl": self.ttl, "user_quota": self.user_quota}
+
+
+def document_owner(headers, remote_addr, trust_header=TRUST_USER_HEADER, trusted_proxies=TRUSTED_PROXIES):
+    """
+    Who a request's stored documents belong to (and whose quota they count
+    against): the X-User-Id header if it is trusted, else the client address
+    (as forwarded by a trusted proxy). A client can't claim another user's
+    documents by setting the header itself.
+    """
+    from_proxy = remote_addr in trusted_proxies
+    if trust_header or from_proxy:
+        user = headers.get("X-User-Id")
+        if user:
+            return user
+    if from_proxy:
+        # The proxy appends the address it got the request from
+        forwarded = [address.strip() for address in headers.get("X-Forwarded-For", "").split(",")
+                     if address.strip()]
+        if forwarded:
+            return forwarded[-1]
+    return remote_addr or "anonymous"
+
+
+_document_store = None
+_document_store_lock = threading.Lock()
+
+
+def get_document_store():
+    """The process-wide DocumentStore at DOC_STORE_DIR, evicting in the background."""
+    global _document_store
+    with _document_store_lock:
+        if _document_store is None:
+            _document_store = DocumentStore()
+            _document_store.evict()
+            _document_store.start_evictor()
+        return _document_store
@@ -0,0 +1,241 @@
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+# Local embedding model used for semantic retrieval ("lsa" or "hashing", see
+# EMBEDDERS) and its number of dimensions; nothing is downloaded
+EMBEDDER = os.getenv("EMBEDDER", "lsa")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "128"))
+
+# Rows of a stored embedding matrix scored per NumPy call, so a memory-mapped
+# matrix is read in bounded pieces
+SEARCH_BATCH_ROWS = int(os.getenv("SEARCH_BATCH_ROWS", "8192"))
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbedder:
+    """
+    Hashed character n-grams (3-5, within words): needs no fitting, and
+    matches inflections and compounds of the same words.
+    """
+    name = "hashing"
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.vectorizer = HashingVectorizer(n_features=dim, analyzer="char_wb", ngram_range=(3, 5),
+                                            alternate_sign=False, norm=None)
+
+    @property
+    def config(self):
+        return f"{self.name}-{self.dim}"
+
+    def fit(self, texts):
+        return self
+
+    def transform(self, texts):
+        """Unit-length float32 embeddings of texts, one row each."""
+        counts = self.vectorizer.transform(texts)
+        counts.data = np.log1p(counts.data)
+        return _normalize(counts.toarray())
+
+    def state(self):
+        return {"dim": np.array(self.dim)}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(int(state["dim"]))
+
+
+class LsaEmbedder:
+    """
+    Latent semantic analysis fitted on one document's chunks: hashed words,
+    TF-IDF weighted, projected on the top singular vectors, so words that
+    occur in the same chunks end up close even when the question uses one
+    and the chunk the other. Only the hashed words that occur in more than
+    one chunk are kept (unless there are too few of them), which keeps the
+    model small.
+    """
+    name = "lsa"
+
+    def __init__(self, dim=EMBEDDING_DIM, features=None, idf=None, components=None):
+        self.dim = dim
+        self.vectorizer = HashingVectorizer(n_features=2 ** 20, stop_words="english",
+                                            alternate_sign=False, norm=None)
+        self.features = features  # Sorted hashed feature indices seen when fitting
+        self.idf = idf
+        self.components = components  # None: the TF-IDF vectors are used as they are
+
+    @property
+    def config(self):
+        return f"{self.name}-{self.dim}"
+
+    def _tfidf(self, texts):
+        counts = self.vectorizer.transform(texts).tocoo()
+        columns = np.searchsorted(self.features, counts.col)
+        known = (columns < len(self.features)) & (self.features[np.minimum(columns, len(self.features) - 1)]
+                                                  == counts.col)
+        weights = sparse.csr_matrix(
+            ((1 + np.log(counts.data[known])) * self.idf[columns[known]], (counts.row[known], columns[known])),
+            shape=(counts.shape[0], len(self.features)), dtype=np.float32,
+        )
+        return normalize(weights)
+
+    def fit(self, texts):
+        counts = self.vectorizer.transform(texts).tocsc()
+        df = np.diff(counts.indptr)
+        self.features = np.flatnonzero(df >= 2)
+        if len(self.features) < self.dim:
+            self.features = np.flatnonzero(df)
+        self.features = self.features.astype(np.int64)
+        df = df[self.features]
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        if len(self.features) == 0:
+            self.features = np.zeros(1, dtype=np.int64)
+            self.idf = np.zeros(1, dtype=np.float32)
+        tfidf = self._tfidf(texts)
+        rank = min(self.dim, len(texts), len(self.features) - 1)
+        if rank < 2:
+            self.components = None
+        else:
+            svd = TruncatedSVD(n_components=rank, random_state=0).fit(tfidf)
+            self.components = svd.components_.astype(np.float32)
+        return self
+
+    def transform(self, texts):
+        """Unit-length float32 embeddings of texts, one row each."""
+        tfidf = self._tfidf(texts)
+        return _normalize(tfidf.toarray() if self.components is None else tfidf @ self.components.T)
+
+    def state(self):
+        state = {"dim": np.array(self.dim), "features": self.features, "idf": self.idf}
+        if self.components is not None:
+            state["components"] = self.components
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(int(state["dim"]), state["features"], state["idf"], state.get("components"))
+
+
+EMBEDDERS = {embedder.name: embedder for embedder in (LsaEmbedder, HashingEmbedder)}
+
+
+def get_embedder(name=EMBEDDER, dim=EMBEDDING_DIM):
+    """A new, unfitted embedder. Raises ValueError for an unknown name."""
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder {name!r}; choose one of {', '.join(EMBEDDERS)}.")
+    return EMBEDDERS[name](dim)
+
+
+def cosine_top_k(matrix, queries, k, batch_rows=SEARCH_BATCH_ROWS):
+    """
+    The k rows of matrix most similar to each query (rows of both are unit
+    length, so the dot product is the cosine), scanning matrix in batches of
+    batch_rows rows. Returns (indices, scores), each of shape
+    (len(queries), min(k, len(matrix))), best first.
+    """
+    queries = np.atleast_2d(queries)
+    k = min(k, len(matrix))
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    best_indices = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(matrix), batch_rows):
+        batch = queries @ np.asarray(matrix[start:start + batch_rows]).T
+        rows = np.broadcast_to(np.arange(start, start + batch.shape[1]), batch.shape)
+        # Merge this batch with the best so far, keeping k per query
+        scores = np.concatenate([best_scores, batch], axis=1)
+        indices = np.concatenate([best_indices, rows], axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            indices = np.take_along_axis(indices, keep, axis=1)
+        best_scores, best_indices = scores, indices
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+class VectorIndex:
+    """
+    Embeddings of a fixed list of passages (a float32 matrix, one unit row
+    per passage) with the embedder fitted on them, for embedding queries.
+    Saved as a .npy matrix that is memory-mapped when loaded, so only the
+    rows being scored are paged in.
+    """
+
+    def __init__(self, embedder, matrix):
+        self.embedder = embedder
+        self.matrix = matrix
+
+    @classmethod
+    def build(cls, texts, embedder=None):
+        embedder = (embedder or get_embedder()).fit(texts or [""])
+        matrix = embedder.transform(texts or [""])
+        return cls(embedder, matrix[:len(texts)])
+
+    def scores(self, query):
+        """Cosine similarity of query to every passage."""
+        query = self.embedder.transform([query])[0]
+        scores = np.empty(len(self.matrix), dtype=np.float32)
+        for start in range(0, len(self.matrix), SEARCH_BATCH_ROWS):
+            stop = start + SEARCH_BATCH_ROWS
+            scores[start:stop] = np.asarray(self.matrix[start:stop]) @ query
+        return scores
+
+    def top_k(self, queries, k=3):
+        """For each query, [(passage, score)] of its k most similar passages, best first."""
+        indices, scores = cosine_top_k(self.matrix, self.embedder.transform(queries), k)
+        return [list(zip(row.tolist(), row_scores.tolist())) for row, row_scores in zip(indices, scores)]
+
+    def save(self, directory):
+        """Writes embeddings.<config>.npy and embedder.<config>.npz into directory."""
+        config = self.embedder.config
+        # Per process and thread, so concurrent saves never share a temporary file
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        np.save(os.path.join(directory, f"embeddings.{config}.{suffix}.npy"), self.matrix)
+        np.savez(os.path.join(directory, f"embedder.{config}.{suffix}.npz"), **self.embedder.state())
+        # Matrix first: the embedder file is what marks the index as saved
+        os.replace(os.path.join(directory, f"embeddings.{config}.{suffix}.npy"),
+                   os.path.join(directory, f"embeddings.{config}.npy"))
+        os.replace(os.path.join(directory, f"embedder.{config}.{suffix}.npz"),
+                   os.path.join(directory, f"embedder.{config}.npz"))
+
+    @classmethod
+    def load(cls, directory, name=EMBEDDER, dim=EMBEDDING_DIM):
+        """The index saved in directory by an embedder of this name and dim. Raises OSError if there is none."""
+        config = get_embedder(name, dim).config
+        with np.load(os.path.join(directory, f"embedder.{config}.npz")) as data:
+            embedder = EMBEDDERS[name].from_state({key: data[key] for key in data.files})
+        return cls(embedder, np.load(os.path.join(directory, f"embeddings.{config}.npy"), mmap_mode="r"))
+
+
+def hybrid_top_k(lexical, semantic, k=3, weight=0.5):
+    """
+    Fuses lexical (e.g. BM25) and semantic (cosine) scores of the same
+    passages: weight * cosine + (1 - weight) * lexical / max(lexical).
+    weight 0 ranks by the lexical scores only, 1 by the cosine only.
+    Returns [(passage, score)] of the k best passages with a positive fused
+    score, best first.
+    """
+    fused = np.zeros(len(lexical) if lexical is not None else len(semantic), dtype=np.float64)
+    if lexical is not None and weight < 1:
+        top = np.max(lexical, initial=0)
+        if top > 0:
+            fused += (1 - weight) * np.asarray(lexical) / top
+    if semantic is not None and weight > 0:
+        fused += weight * np.clip(semantic, 0, None)
+    matched = np.flatnonzero(fused > 0)
+    if 0 < k < len(matched):
+        # Only the k best (and passages tied with the k-th) are sorted
+        kth = fused[matched[np.argpartition(-fused[matched], k - 1)[k - 1]]]
+        matched = matched[fused[matched] >= kth]
+    order = matched[np.argsort(-fused[matched], kind="stable")[:k]]
+    return [(passage, float(fused[passage])) for passage in order.tolist()]
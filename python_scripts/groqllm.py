@@ -1,56 +1,86 @@
-from groq import Groq
-from dotenv import load_dotenv
 import os
+from concurrent.futures import ThreadPoolExecutor
+from python_scripts.llm_gateway import get_llm_gateway
+from python_scripts.tokens import split_by_tokens
 # from spacings import add_space_after_punctuation
 
-load_dotenv()
+CLEAN_TEXT_MODEL = "llama-3.3-70b-versatile"
+CLEAN_TEXT_TEMPERATURE = 0.5
+CLEAN_TEXT_MAX_TOKENS = 1024
+CLEAN_TEXT_PROMPT = (
+    "You are a helpful assistant. Text will be provided to you, "
+    "you need to remove the unnecessary content out of it which "
+    "doesn't make sense and keep the actual text out of it. "
+    "Just give the formatted text with perfect format. Nothing else."
+    "Add punctuations wherever necessary"
+)
+# Input tokens per cleanup request (leaving the reply room within
+# CLEAN_TEXT_MAX_TOKENS) and how many requests run at once
+CLEAN_TEXT_CHUNK_TOKENS = int(os.getenv("CLEAN_TEXT_CHUNK_TOKENS", "700"))
+CLEAN_TEXT_CONCURRENCY = int(os.getenv("CLEAN_TEXT_CONCURRENCY", "4"))
+# Identifies clean_text's output for caching; changes with the model, prompt or chunking
+CLEAN_TEXT_CONFIG = (f"{CLEAN_TEXT_MODEL}:{CLEAN_TEXT_TEMPERATURE}:{CLEAN_TEXT_MAX_TOKENS}"
+                     f":{CLEAN_TEXT_CHUNK_TOKENS}:{CLEAN_TEXT_PROMPT}")
 
-api_key = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=api_key)
 
+def _clean_chunk(chunk):
+    chat_completion = get_llm_gateway().chat(
+        messages=[
+            {
+                "role": "system",
+                "content": CLEAN_TEXT_PROMPT,
+            },
+            {
+                "role": "user",
+                "content": chunk,
+            }
+        ],
+        model=CLEAN_TEXT_MODEL,
+        temperature=CLEAN_TEXT_TEMPERATURE,
+        max_completion_tokens=CLEAN_TEXT_MAX_TOKENS,
+        top_p=1,
+        stop=None,
+    )
+    return chat_completion.choices[0].message.content
+
+
+def clean_text_with_status(corrected_text):
+    """
+    Like clean_text, also returning how many chunks failed (and were kept
+    uncleaned), so callers can tell a complete cleanup from a partial one.
+    """
+    pieces = split_by_tokens(corrected_text, CLEAN_TEXT_CHUNK_TOKENS)
+    outputs = [chunk for _, chunk in pieces]  # Blank chunks are kept as they are
+    pending = [index for index, (_, chunk) in enumerate(pieces) if chunk.strip()]
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(CLEAN_TEXT_CONCURRENCY, len(pending)))) as executor:
+        futures = {index: executor.submit(_clean_chunk, pieces[index][1]) for index in pending}
+        for index, future in futures.items():
+            try:
+                outputs[index] = future.result().strip()
+            except Exception:
+                # Keep this chunk as it was rather than failing the whole text
+                outputs[index] = pieces[index][1]
+                failures += 1
+    return "".join(separator + output for (separator, _), output in zip(pieces, outputs)), failures
 
 
 def clean_text(corrected_text):
     """
     Uses Groq's API to clean and format text by removing unnecessary content.
 
+    Long text is split into chunks of at most CLEAN_TEXT_CHUNK_TOKENS tokens
+    on paragraph/line boundaries, cleaned concurrently (at most
+    CLEAN_TEXT_CONCURRENCY requests at a time) and stitched back in order.
+    A chunk whose request fails is kept as it was.
+
     Parameters:
         input_text (str): The raw text input to be cleaned.
 
     Returns:
         str: The cleaned and formatted text.
     """
-    try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant. Text will be provided to you, "
-                        "you need to remove the unnecessary content out of it which "
-                        "doesn't make sense and keep the actual text out of it. "
-                        "Just give the formatted text with perfect format. Nothing else."
-                        "Add punctuations wherever necessary"
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": corrected_text,
-                }
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.5,
-            max_completion_tokens=1024,
-            top_p=1,
-            stop=None,
-            stream=False,
-        )
-        
-        groqtext = chat_completion.choices[0].message.content
-        return groqtext
-    
-    except Exception as e:
-        return f"Error: {str(e)}"
+    return clean_text_with_status(corrected_text)[0]
 
 # Example usage:
 # cleaned_text = clean_text("hi helo whatsapp")
@@ -0,0 +1,305 @@
+import asyncio
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+from functools import partial
+
+from python_scripts.llm_stream import astream_events, stream_events
+
+try:
+    import groq
+    import httpx
+except ImportError:
+    groq = None  # LLM features report themselves unavailable
+
+# One pooled client per process; at most LLM_MAX_CONCURRENCY requests in
+# flight in total and LLM_MODEL_CONCURRENCY per model (streams hold their
+# slot until they end). Requests failing with 429, 5xx or a connection
+# error are retried up to LLM_MAX_RETRIES times after the delay the
+# rate-limit headers ask for, or else a jittered exponential backoff.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+# Longest wait before a retry; a rate limit resetting later fails instead
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "20"))
+# How often async callers waiting for a slot check again
+ASYNC_SLOT_POLL_SECONDS = 0.02
+
+RETRY_STATUS_CODES = {408, 409, 429}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """
+    Seconds in a rate-limit header value: a number of seconds, an HTTP
+    date, or a duration like "1m30.5s" or "250ms". None if unparsable.
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def retry_after(headers):
+    """The delay (seconds) rate-limit response headers ask for before retrying, or None."""
+    if not headers:
+        return None
+    milliseconds = parse_duration(headers.get("retry-after-ms"))
+    if milliseconds is not None:
+        return milliseconds / 1000
+    delay = parse_duration(headers.get("retry-after"))
+    if delay is not None:
+        return delay
+    # Groq: time until the exhausted request or token budget resets
+    resets = [parse_duration(headers.get(name)) for name in
+              ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+              if headers.get(f"x-ratelimit-remaining-{name.rsplit('-', 1)[1]}") in ("0", 0)]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def _is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUS_CODES or status >= 500
+    if groq is not None and isinstance(error, groq.APIConnectionError):
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class LLMGateway:
+    """
+    Shared entry point for chat completions: one pooled HTTP client (sync
+    and async), global and per-model concurrency limits, and retries with
+    backoff. chat() and achat() return completions like
+    client.chat.completions.create; stream() and astream() yield the events
+    of stream_chat_completion. The client is built from GROQ_API_KEY on
+    first use, or can be swapped for any object with the same
+    chat.completions.create (e.g. a local fake in tests) with set_client.
+    """
+
+    def __init__(self, client=None, async_client=None, api_key=None, max_concurrency=LLM_MAX_CONCURRENCY,
+                 model_concurrency=LLM_MODEL_CONCURRENCY, max_retries=LLM_MAX_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX):
+        self.api_key = api_key
+        self.model_concurrency = model_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = client
+        self._async_client = async_client
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._models = {}
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "retries": 0, "failures": 0}
+
+    def set_client(self, client, async_client=None):
+        """Sends requests to client (and async ones to async_client) from now on."""
+        with self._lock:
+            self._client = client
+            self._async_client = async_client
+
+    def _api_key(self):
+        return self.api_key or os.getenv("GROQ_API_KEY")
+
+    @property
+    def configured(self):
+        """Whether requests can be made: a client was set, or groq is installed and has an API key."""
+        return self._client is not None or (groq is not None and bool(self._api_key()))
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._check_configured()
+                # Retries are the gateway's, so the SDK's own are turned off
+                self._client = groq.Groq(api_key=self._api_key(), max_retries=0, timeout=LLM_TIMEOUT,
+                                         http_client=httpx.Client(limits=self._limits()))
+            return self._client
+
+    @property
+    def async_client(self):
+        with self._lock:
+            if self._async_client is None:
+                self._check_configured()
+                self._async_client = groq.AsyncGroq(api_key=self._api_key(), max_retries=0, timeout=LLM_TIMEOUT,
+                                                    http_client=httpx.AsyncClient(limits=self._limits()))
+            return self._async_client
+
+    def _check_configured(self):
+        if groq is None:
+            raise RuntimeError("Groq library not installed. LLM features are unavailable.")
+        if not self._api_key():
+            raise RuntimeError("Groq API key is not configured.")
+
+    @staticmethod
+    def _limits():
+        return httpx.Limits(max_connections=LLM_POOL_CONNECTIONS, max_keepalive_connections=LLM_POOL_CONNECTIONS)
+
+    def _model_semaphore(self, model):
+        with self._lock:
+            semaphore = self._models.get(model)
+            if semaphore is None:
+                semaphore = self._models[model] = threading.BoundedSemaphore(self.model_concurrency)
+            return semaphore
+
+    def _acquire(self, model):
+        # The model's slot first, so requests queued for a busy model don't
+        # hold global slots other models could use
+        semaphores = (self._model_semaphore(model), self._global)
+        semaphores[0].acquire()
+        try:
+            semaphores[1].acquire()
+        except BaseException:
+            semaphores[0].release()
+            raise
+        return semaphores
+
+    async def _aacquire(self, model):
+        # Polls the same (thread) semaphores, so sync and async requests share
+        # the limits and a cancelled wait holds nothing
+        semaphores = (self._model_semaphore(model), self._global)
+        for index, semaphore in enumerate(semaphores):
+            try:
+                while not semaphore.acquire(blocking=False):
+                    await asyncio.sleep(ASYNC_SLOT_POLL_SECONDS)
+            except BaseException:
+                for held in semaphores[:index]:
+                    held.release()
+                raise
+        return semaphores
+
+    def _delay(self, error, attempt):
+        """Seconds to wait before retrying after error, or None to give up."""
+        if attempt >= self.max_retries or not _is_retryable(error):
+            return None
+        response = getattr(error, "response", None)
+        delay = retry_after(getattr(response, "headers", None))
+        if delay is None:
+            # Full jitter, so callers throttled together don't retry together
+            return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return delay if delay <= self.backoff_max else None
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _request(self, request):
+        # Runs request() in a slot, retrying failures; returns its result and
+        # the semaphores of the slot, still held (_release frees them)
+        model = request.keywords.get("model")
+        attempt = 0
+        while True:
+            semaphores = self._acquire(model)
+            try:
+                self._count("requests")
+                return request(), semaphores
+            except BaseException as e:
+                # Including cancellation, which must not leave the slot held
+                _release(semaphores)
+                delay = self._delay(e, attempt) if isinstance(e, Exception) else None
+                if delay is None:
+                    self._count("failures")
+                    raise
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def chat(self, **request):
+        """A chat completion (stream=False) for the keyword arguments of chat.completions.create."""
+        client = self.client
+        completion, semaphores = self._request(partial(client.chat.completions.create, stream=False, **request))
+        _release(semaphores)
+        return completion
+
+    def stream(self, **request):
+        """
+        A generator of the events of a streamed chat completion (see
+        stream_chat_completion). The request is made, and its slot taken,
+        when the first event is requested; closing the generator ends the
+        upstream request and frees the slot.
+        """
+        client = self.client
+        start = time.perf_counter()
+        stream, semaphores = self._request(partial(client.chat.completions.create, stream=True, **request))
+        try:
+            yield from stream_events(stream, start)
+        finally:
+            _release(semaphores)
+
+    async def _arequest(self, request):
+        model = request.keywords.get("model")
+        attempt = 0
+        while True:
+            semaphores = await self._aacquire(model)
+            try:
+                self._count("requests")
+                return await request(), semaphores
+            except BaseException as e:
+                _release(semaphores)
+                delay = self._delay(e, attempt) if isinstance(e, Exception) else None
+                if delay is None:
+                    self._count("failures")
+                    raise
+            self._count("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def achat(self, **request):
+        """Like chat, for asyncio callers."""
+        client = self.async_client
+        completion, semaphores = await self._arequest(
+            partial(client.chat.completions.create, stream=False, **request))
+        _release(semaphores)
+        return completion
+
+    async def astream(self, **request):
+        """Like stream, for asyncio callers: an async generator of the events."""
+        client = self.async_client
+        start = time.perf_counter()
+        stream, semaphores = await self._arequest(
+            partial(client.chat.completions.create, stream=True, **request))
+        try:
+            async for event in astream_events(stream, start):
+                yield event
+        finally:
+            _release(semaphores)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def _release(semaphores):
+    for semaphore in reversed(semaphores):
+        semaphore.release()
+
+
+_llm_gateway = None
+_llm_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    """The process-wide LLMGateway all features send their LLM requests through."""
+    global _llm_gateway
+    with _llm_gateway_lock:
+        if _llm_gateway is None:
+            _llm_gateway = LLMGateway()
+        return _llm_gateway
@@ -0,0 +1,71 @@
+import time
+
+
+def stream_chat_completion(client, **request):
+    """
+    Requests a chat completion with stream=True and yields events as the
+    tokens arrive: {"event": "token", "text": ...} for every piece of text,
+    then {"event": "done", "ttft_seconds": ..., "total_seconds": ...,
+    "finish_reason": ...}, times measured from the request.
+    Closing the generator (e.g. when the client of a streamed response
+    disconnects) closes the upstream connection, which stops the generation.
+    """
+    start = time.perf_counter()
+    yield from stream_events(client.chat.completions.create(stream=True, **request), start)
+
+
+def stream_events(stream, start):
+    """
+    The events of stream_chat_completion for an already requested stream
+    of completion chunks, requested at start (a time.perf_counter() value).
+    """
+    first_token = None
+    finish_reason = None
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            text = choice.delta.content
+            if text:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                yield {"event": "token", "text": text}
+        yield {
+            "event": "done",
+            "ttft_seconds": round(first_token - start, 3) if first_token is not None else None,
+            "total_seconds": round(time.perf_counter() - start, 3),
+            "finish_reason": finish_reason,
+        }
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+async def astream_events(stream, start):
+    """Like stream_events, for an async stream of completion chunks."""
+    first_token = None
+    finish_reason = None
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            text = choice.delta.content
+            if text:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                yield {"event": "token", "text": text}
+        yield {
+            "event": "done",
+            "ttft_seconds": round(first_token - start, 3) if first_token is not None else None,
+            "total_seconds": round(time.perf_counter() - start, 3),
+            "finish_reason": finish_reason,
+        }
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
@@ -1,16 +1,167 @@
 from paddleocr import PaddleOCR
 import numpy as np
 import cv2
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from python_scripts.pdf_text import iter_pdf_page_images
+
+# Batch OCR worker processes (0 or unset: one per CPU), how they are started
+# ("spawn" by default, as Paddle's threads don't survive a fork) and how many
+# text crops the recognizer runs per batch
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or os.cpu_count() or 1
+OCR_START_METHOD = os.getenv("OCR_START_METHOD", "spawn")
+OCR_REC_BATCH_NUM = int(os.getenv("OCR_REC_BATCH_NUM", "16"))
+
+# Load the model when the app starts rather than on the first request:
+# "1" loads it at import (before any fork, so forked workers share it),
+# "background" loads it in a thread; unset/"0" keeps it lazy
+OCR_PRELOAD = os.getenv("OCR_PRELOAD", "0")
+
+# Preprocessing before recognition: images are decoded in grayscale and
+# downscaled so their longer side fits OCR_MAX_SIDE, unless that would make
+# the shorter side smaller than OCR_MIN_SIDE (long strips such as scrolled
+# screenshots); those keep a legible width and are recognized in tiles of
+# OCR_MAX_SIDE overlapping by OCR_TILE_OVERLAP pixels
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") != "0"
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2560"))
+OCR_MIN_SIDE = int(os.getenv("OCR_MIN_SIDE", "1000"))
+OCR_TILE_OVERLAP = int(os.getenv("OCR_TILE_OVERLAP", "128"))
+
+# Scanned PDFs: render resolution, and a cap on the pixels of one rendered
+# page (bounds memory per page; larger pages are rendered at a lower DPI)
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", "200"))
+OCR_PDF_MAX_PIXELS = int(os.getenv("OCR_PDF_MAX_PIXELS", "16000000"))
+
+# Identifies the recognizer's output for caching; bump when the model changes
+OCR_CONFIG = (f"paddleocr:en:angle_cls:gray={OCR_GRAYSCALE}:max={OCR_MAX_SIDE}"
+              f":min={OCR_MIN_SIDE}:overlap={OCR_TILE_OVERLAP}")
 
 # You can initialize PaddleOCR once for performance
 _ocr_instance = None
+_ocr_lock = threading.Lock()
+# Lifecycle of this process's model: not_loaded -> loading -> ready | failed
+_ocr_status = {"state": "not_loaded", "load_seconds": None, "warmup_seconds": None, "error": None}
 
-def get_ocr_instance():
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def _warm_up(ocr):
+    # One inference on a synthetic page so lazy initialization inside Paddle
+    # (kernel selection, memory pools) happens now, not on a user's image
+    img = np.full((96, 480, 3), 255, dtype=np.uint8)
+    cv2.putText(img, "Warm up 123", (10, 64), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    ocr.ocr(img, cls=True)
+
+def get_ocr_instance(warm_up=True):
+    """
+    This process's PaddleOCR, built (and warmed up) on first use. Safe to call
+    from several threads: the model is only ever built once.
+    """
     global _ocr_instance
-    if _ocr_instance is None:
-        _ocr_instance = PaddleOCR(use_angle_cls=True, lang="en", show_log=False)
+    if _ocr_instance is not None:
+        return _ocr_instance
+    with _ocr_lock:
+        if _ocr_instance is None:
+            _ocr_status.update(state="loading", error=None)
+            start = time.perf_counter()
+            try:
+                ocr = PaddleOCR(use_angle_cls=True, lang="en", show_log=False,
+                                rec_batch_num=OCR_REC_BATCH_NUM)
+                loaded = time.perf_counter()
+                if warm_up:
+                    _warm_up(ocr)
+            except Exception as e:
+                _ocr_status.update(state="failed", error=str(e))
+                raise
+            _ocr_status.update(
+                state="ready",
+                load_seconds=round(loaded - start, 3),
+                warmup_seconds=round(time.perf_counter() - loaded, 3) if warm_up else None,
+            )
+            _ocr_instance = ocr
     return _ocr_instance
 
+def preload_ocr(mode=OCR_PRELOAD):
+    """
+    Loads the model according to mode ("1", "background" or "0"; see
+    OCR_PRELOAD). Load failures are recorded in ocr_status().
+    """
+    def load():
+        try:
+            get_ocr_instance()
+        except Exception:
+            pass  # Reported by ocr_status()
+    if mode == "background":
+        threading.Thread(target=load, name="ocr-preload", daemon=True).start()
+    elif mode not in ("", "0"):
+        load()
+
+def ocr_status():
+    """Load state of this process's model, with load and warm-up times (s)."""
+    status = dict(_ocr_status)
+    status["ready"] = status["state"] == "ready"
+    return status
+
+def decode_image(data, grayscale=OCR_GRAYSCALE):
+    """
+    Decodes image bytes into a grayscale (or BGR) array.
+    Raises ValueError if they aren't an image.
+    """
+    flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if img is None:
+        raise ValueError("Invalid or unsupported image file.")
+    return img
+
+def preprocess_image(img, max_side=OCR_MAX_SIDE, min_side=OCR_MIN_SIDE, grayscale=OCR_GRAYSCALE):
+    """Converts to grayscale and downscales an image as described at OCR_MAX_SIDE."""
+    if grayscale and img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    height, width = img.shape[:2]
+    short, long = sorted((height, width))
+    scale = min(1.0, max_side / long)
+    if short * scale < min(short, min_side):
+        scale = min(1.0, min_side / short)
+    if scale < 1.0:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return img
+
+def _tiles(length, tile_size, overlap):
+    # (start, stop, owned_from, owned_to) along the long axis; each line is
+    # kept by the one tile owning its centre, so overlaps aren't read twice
+    if length <= tile_size:
+        return [(0, length, 0, length)]
+    starts = list(range(0, length - overlap, tile_size - overlap))
+    tiles = []
+    for k, start in enumerate(starts):
+        owned_from = 0 if k == 0 else start + overlap // 2
+        owned_to = length if k == len(starts) - 1 else starts[k + 1] + overlap // 2
+        tiles.append((start, min(start + tile_size, length), owned_from, owned_to))
+    return tiles
+
+def recognize_text(img):
+    """
+    Runs detection, angle classification and recognition on a decoded image,
+    after preprocess_image; long strips are recognized tile by tile.
+    """
+    img = preprocess_image(img)
+    axis = 0 if img.shape[0] >= img.shape[1] else 1
+    ocr = get_ocr_instance()
+    extracted_text = []
+    for start, stop, owned_from, owned_to in _tiles(img.shape[axis], OCR_MAX_SIDE, OCR_TILE_OVERLAP):
+        tile = img[start:stop] if axis == 0 else np.ascontiguousarray(img[:, start:stop])
+        for result in ocr.ocr(tile, cls=True):
+            for line in result or []:  # None when nothing was detected
+                # Box corners are (x, y) points
+                centre = start + sum(point[1 - axis] for point in line[0]) / len(line[0])
+                if owned_from <= centre < owned_to:
+                    extracted_text.append(line[1][0])
+    return "\n".join(extracted_text).strip() or "No text detected in the image."
+
 def extract_text_from_file(file_obj):
     """
     Extracts text from an uploaded image file-like object using PaddleOCR.
@@ -22,16 +173,85 @@ def extract_text_from_file(file_obj):
         ValueError: If the image cannot be processed or OCR fails.
     """
     try:
-        file_bytes = np.frombuffer(file_obj.read(), np.uint8)
-        img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-        if img is None:
-            raise ValueError("Invalid or unsupported image file.")
-        ocr = get_ocr_instance()
-        results = ocr.ocr(img, cls=True)
-        extracted_text = []
-        for result in results:
-            for line in result:
-                extracted_text.append(line[1][0])
-        return "\n".join(extracted_text).strip() or "No text detected in the image."
+        return recognize_text(decode_image(file_obj.read()))
     except Exception as e:
-        raise ValueError(f"OCR extraction failed: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"OCR extraction failed: {str(e)}")
+
+def _ocr_image_result(data):
+    start = time.perf_counter()
+    try:
+        result = {"text": recognize_text(decode_image(data)), "error": None}
+    except Exception as e:
+        result = {"text": None, "error": f"OCR extraction failed: {str(e)}"}
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def _init_ocr_worker():
+    # Load the model when the worker starts, not on its first image
+    get_ocr_instance()
+
+def _ocr_chunk(chunk):
+    return [(index, _ocr_image_result(data)) for index, data in chunk]
+
+def get_ocr_pool():
+    """The process pool used for batch OCR; each worker holds its own PaddleOCR."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=multiprocessing.get_context(OCR_START_METHOD),
+                initializer=_init_ocr_worker,
+            )
+        return _ocr_pool
+
+def extract_texts_from_images(images, max_workers=OCR_WORKERS):
+    """
+    OCRs many images, spreading them over the worker pool in contiguous
+    chunks (several per worker so a slow page doesn't leave the others idle).
+    Args:
+        images: List of image bytes.
+        max_workers: 1 runs everything in this process.
+    Returns:
+        list: One dict per image, in input order, with "text", "error" (None
+        on success) and "seconds" (decode + OCR time for that image).
+    """
+    if max_workers <= 1 or len(images) <= 1:
+        return [_ocr_image_result(data) for data in images]
+    indexed = list(enumerate(images))
+    size = max(1, -(-len(indexed) // (max_workers * 2)))
+    chunks = [indexed[start:start + size] for start in range(0, len(indexed), size)]
+    results = [None] * len(images)
+    for chunk_results in get_ocr_pool().map(_ocr_chunk, chunks):
+        for index, result in chunk_results:
+            results[index] = result
+    return results
+
+def iter_pdf_ocr(pdf, dpi=OCR_PDF_DPI, max_pages=None, max_pixels=OCR_PDF_MAX_PIXELS):
+    """
+    OCRs a scanned PDF (bytes or a file-like object) page by page, rasterizing one page at a time.
+    Yields a dict per page: "page" (1-based), "text", "width"/"height" of the
+    rendered page, "render_seconds", "ocr_seconds" and "megapixels_per_second".
+    """
+    pages = iter_pdf_page_images(pdf, dpi=dpi, max_pixels=max_pixels, max_pages=max_pages)
+    number = 0
+    while True:
+        start = time.perf_counter()
+        image = next(pages, None)
+        if image is None:
+            return
+        rendered = time.perf_counter()
+        text = recognize_text(image)
+        done = time.perf_counter()
+        number += 1
+        height, width = image.shape[:2]
+        del image  # Not kept alive while the next page renders
+        yield {
+            "page": number,
+            "text": text,
+            "width": width,
+            "height": height,
+            "render_seconds": round(rendered - start, 3),
+            "ocr_seconds": round(done - rendered, 3),
+            "megapixels_per_second": round(width * height / 1e6 / max(done - start, 1e-9), 2),
+        }
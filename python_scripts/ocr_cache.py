@@ -0,0 +1,166 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+# On-disk cache of OCR pipeline stages; evicted least recently used first
+# once the stored text exceeds OCR_CACHE_MAX_BYTES. OCR_CACHE_PATH="" disables it.
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite3")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at);
+-- Running total of entries.size, kept by the triggers so a put doesn't sum the table
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) SELECT 'total_size', COALESCE(SUM(size), 0) FROM entries;
+CREATE TRIGGER IF NOT EXISTS entries_insert_size AFTER INSERT ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE name = 'total_size';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update_size AFTER UPDATE OF size ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size - OLD.size WHERE name = 'total_size';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete_size AFTER DELETE ON entries BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE name = 'total_size';
+END;
+"""
+
+
+def content_hash(data):
+    """Hex SHA-256 of bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def stage_key(parent_key, stage, config):
+    """
+    Key of a stage's output: derived from the key of its input (the image
+    hash for the first stage) and the stage's configuration, so changing
+    one stage's configuration only changes the keys of it and later stages.
+    """
+    return content_hash(f"{parent_key}\0{stage}\0{config}".encode("utf-8"))
+
+
+class StageCache:
+    """
+    Content-addressed SQLite store of pipeline stage outputs (text), with
+    least-recently-used eviction bounded by the total stored size and
+    per-stage hit/miss counters for this process.
+    """
+
+    def __init__(self, path, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._evictions = 0
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _count(self, stage, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(stage, {"hits": 0, "misses": 0})
+            counters[outcome] += 1
+
+    def get(self, key, stage):
+        """The cached text for key, or None."""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._count(stage, "misses" if row is None else "hits")
+        return None if row is None else row[0]
+
+    def put(self, key, stage, value):
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete
+            # doesn't fire the delete trigger keeping the total size
+            conn.execute(
+                "INSERT INTO entries (key, stage, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET stage = excluded.stage, "
+                "value = excluded.value, size = excluded.size, created_at = excluded.created_at, "
+                "accessed_at = excluded.accessed_at",
+                (key, stage, value, size, now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% of the budget so every put doesn't evict again
+        excess = total - int(self.max_bytes * 0.9)
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        with self._lock:
+            self._evictions += len(victims)
+
+    def cached(self, key, stage, compute, cacheable=lambda value: True):
+        """Returns the cached value of key, or computes, stores and returns it."""
+        value = self.get(key, stage)
+        if value is None:
+            value = compute()
+            if cacheable(value):
+                self.put(key, stage, value)
+        return value
+
+    def stats(self):
+        """Per-stage hit/miss counts (this process) and what is stored (all processes)."""
+        with closing(self._connect()) as conn:
+            stored = {
+                stage: {"entries": entries, "bytes": size}
+                for stage, entries, size in conn.execute(
+                    "SELECT stage, COUNT(*), SUM(size) FROM entries GROUP BY stage"
+                )
+            }
+        with self._lock:
+            counters = {stage: dict(counts) for stage, counts in self._counters.items()}
+            evictions = self._evictions
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "evictions": evictions,
+            "stages": {
+                stage: {**counters.get(stage, {"hits": 0, "misses": 0}),
+                        **stored.get(stage, {"entries": 0, "bytes": 0})}
+                for stage in sorted(set(counters) | set(stored))
+            },
+        }
+
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """The process-wide StageCache at OCR_CACHE_PATH, or None when caching is disabled."""
+    global _ocr_cache
+    if not OCR_CACHE_PATH:
+        return None
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            _ocr_cache = StageCache(OCR_CACHE_PATH)
+        return _ocr_cache
@@ -0,0 +1,195 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None  # Falls back to PyPDF2
+
+# Deployment-wide defaults; 0 or unset means no limit / no worker processes
+DEFAULT_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "0")) or None
+DEFAULT_MAX_BYTES = int(os.getenv("PDF_MAX_TEXT_BYTES", "0")) or None
+DEFAULT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", "0")) or None
+
+# PDFium is not thread-safe, so in-process calls are serialized
+_pdfium_lock = threading.Lock()
+
+# Set in each worker process by _init_worker
+_worker_document = None
+
+
+def _pdfium_page_text(document, index):
+    page = document[index]
+    try:
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_bounded().replace("\r\n", "\n")
+        finally:
+            textpage.close()
+    finally:
+        page.close()
+
+
+def _iter_pdfium_pages(source, max_pages):
+    with _pdfium_lock:
+        document = pdfium.PdfDocument(source)
+    try:
+        count = len(document) if max_pages is None else min(len(document), max_pages)
+        for index in range(count):
+            with _pdfium_lock:
+                text = _pdfium_page_text(document, index)
+            yield text
+    finally:
+        with _pdfium_lock:
+            document.close()
+
+
+def _iter_pypdf2_pages(file_obj, max_pages):
+    reader = PdfReader(file_obj)
+    for index, page in enumerate(reader.pages):
+        if max_pages is not None and index >= max_pages:
+            break
+        yield page.extract_text() or ""
+
+
+def _init_worker(pdf_bytes):
+    global _worker_document
+    _worker_document = pdfium.PdfDocument(pdf_bytes)
+
+
+def _extract_page_range(start, stop):
+    return [_pdfium_page_text(_worker_document, index) for index in range(start, stop)]
+
+
+def _iter_parallel_pages(pdf_bytes, page_count, processes, pages_per_task=16):
+    # Each worker opens the document once; at most two ranges per worker are
+    # in flight, so memory stays bounded however long the document is.
+    ranges = [(start, min(start + pages_per_task, page_count))
+              for start in range(0, page_count, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(pdf_bytes,)) as executor:
+        pending = []
+        for start, stop in ranges:
+            pending.append(executor.submit(_extract_page_range, start, stop))
+            if len(pending) >= processes * 2:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def _iter_pages(file_obj, max_pages, backend, processes, min_parallel_pages):
+    if backend not in ("auto", "pdfium", "pypdf2"):
+        raise ValueError(f"Unknown backend: {backend}")
+    if backend == "pypdf2" or pdfium is None:
+        if backend == "pdfium":
+            raise ValueError("pypdfium2 is not installed")
+        yield from _iter_pypdf2_pages(file_obj, max_pages)
+        return
+
+    start = file_obj.tell()
+    if processes and processes > 1:
+        pdf_bytes = file_obj.read()
+        try:
+            with _pdfium_lock:
+                document = pdfium.PdfDocument(pdf_bytes)
+                page_count = len(document)
+                document.close()
+        except pdfium.PdfiumError:
+            if backend == "pdfium":
+                raise
+            file_obj.seek(start)
+            yield from _iter_pypdf2_pages(file_obj, max_pages)
+            return
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+        if page_count >= min_parallel_pages:
+            yield from _iter_parallel_pages(pdf_bytes, page_count, processes)
+        else:
+            yield from _iter_pdfium_pages(pdf_bytes, max_pages)
+        return
+
+    try:
+        pages = _iter_pdfium_pages(file_obj, max_pages)
+        first = next(pages, None)
+    except pdfium.PdfiumError:
+        if backend == "pdfium":
+            raise
+        file_obj.seek(start)
+        yield from _iter_pypdf2_pages(file_obj, max_pages)
+        return
+    if first is not None:
+        yield first
+        yield from pages
+
+
+def iter_pdf_pages(file_obj, max_pages=DEFAULT_MAX_PAGES, max_bytes=DEFAULT_MAX_BYTES,
+                   backend="auto", processes=DEFAULT_PROCESSES, min_parallel_pages=64):
+    """
+    Yields the text of each page of a PDF file-like object, in order, without
+    holding the whole document's text in memory.
+
+    Args:
+        file_obj: Seekable binary file-like object.
+        max_pages: Stop after this many pages.
+        max_bytes: Stop once this many bytes (UTF-8) of text have been
+            yielded; the last page is truncated to fit.
+        backend: "pdfium" (pypdfium2), "pypdf2", or "auto" to use pypdfium2
+            when it is installed and can open the file, PyPDF2 otherwise.
+        processes: Extract pages in this many worker processes when the
+            document has at least min_parallel_pages pages (pdfium only).
+    """
+    remaining = max_bytes
+    for text in _iter_pages(file_obj, max_pages, backend, processes, min_parallel_pages):
+        if remaining is not None:
+            encoded = text.encode("utf-8")
+            if len(encoded) >= remaining:
+                yield encoded[:remaining].decode("utf-8", errors="ignore")
+                return
+            remaining -= len(encoded)
+        yield text
+
+
+def iter_pdf_page_images(source, dpi=200, max_pixels=None, max_pages=DEFAULT_MAX_PAGES):
+    """
+    Yields each page of a PDF (bytes or a seekable file-like object) rendered as a grayscale uint8 array of shape
+    (height, width), one page at a time, so only one page bitmap is held in
+    memory. Pages that would exceed max_pixels at dpi are rendered at a
+    lower resolution to fit. Requires pypdfium2.
+    """
+    if pdfium is None:
+        raise ValueError("Rendering PDF pages requires pypdfium2")
+    with _pdfium_lock:
+        document = pdfium.PdfDocument(source)
+    try:
+        count = len(document) if max_pages is None else min(len(document), max_pages)
+        for index in range(count):
+            with _pdfium_lock:
+                page = document[index]
+                try:
+                    width, height = page.get_size()  # PDF points (1/72 in)
+                    scale = dpi / 72
+                    if max_pixels and width * height * scale * scale > max_pixels:
+                        scale = (max_pixels / (width * height)) ** 0.5
+                    bitmap = page.render(scale=scale, grayscale=True)
+                    try:
+                        # Copy out of the bitmap's buffer so it can be freed now
+                        image = bitmap.to_numpy()[:, :, 0].copy()
+                    finally:
+                        bitmap.close()
+                finally:
+                    page.close()
+            yield image
+    finally:
+        with _pdfium_lock:
+            document.close()
+
+
+def extract_pdf_text(file_obj, separator="", **options):
+    """
+    Text of the whole PDF, with pages joined once by separator.
+    options are passed to iter_pdf_pages.
+    """
+    return separator.join(iter_pdf_pages(file_obj, **options))
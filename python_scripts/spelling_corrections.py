@@ -1,22 +1,181 @@
+import spellchecker
 from spellchecker import SpellChecker
+from array import array
+from functools import lru_cache
+import os
+import threading
+import numpy as np
+
+# Corrections of unknown words remembered per process
+SPELL_CACHE_SIZE = int(os.getenv("SPELL_CACHE_SIZE", "50000"))
+
+# Identifies correct_spelling's output for caching
+SPELL_CONFIG = f"pyspellchecker-{spellchecker.__version__}:en"
+
+
+def _one_edit(source, target, letters):
+    """Whether target is in SpellChecker.edit_distance_1(source) for this alphabet."""
+    n, m = len(source), len(target)
+    if n == m:
+        diffs = [i for i in range(n) if source[i] != target[i]]
+        if not diffs:  # Replacing a letter by itself, or swapping equal neighbours
+            return any(c in letters for c in source) or any(source[i] == source[i + 1] for i in range(n - 1))
+        if len(diffs) == 1:
+            return target[diffs[0]] in letters
+        if len(diffs) == 2:
+            i, j = diffs
+            return j == i + 1 and source[i] == target[j] and source[j] == target[i]
+        return False
+    if abs(n - m) != 1:
+        return False
+    longer, shorter = (source, target) if n > m else (target, source)
+    i = 0
+    while i < len(shorter) and longer[i] == shorter[i]:
+        i += 1
+    if longer[i + 1:] != shorter[i:]:
+        return False
+    # Deleting may drop any character; inserting only adds letters of the alphabet
+    return n > m or longer[i] in letters
+
+
+class SpellEngine:
+    """
+    A SpellChecker with a faster search for words more than one edit away
+    from any dictionary word. SpellChecker tries every string two edits
+    away (hundreds of thousands for a long word); here dictionary words are
+    indexed by their single-character deletes (hashed, in sorted arrays), so
+    only the words sharing a delete with a one-edit variant of the input are
+    looked at. Corrections are identical to SpellChecker.correction.
+    """
+
+    def __init__(self, spell=None):
+        self.spell = spell or SpellChecker()
+        self.dictionary = self.spell.word_frequency.dictionary
+        self.letters = self.spell.word_frequency.letters
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    def should_check(self, word):
+        return self.spell._check_if_should_check(word)
+
+    def is_known(self, word):
+        """Whether the dictionary has word (in any case), so it is left as it is."""
+        lower = word.lower()
+        return lower in self.dictionary and self.should_check(lower)
+
+    def correction(self, word):
+        """Same result as SpellChecker.correction(word)."""
+        if self.is_known(word):
+            return word
+        if not self.should_check(word):
+            return word
+        edits = self.spell.edit_distance_1(word)
+        found = self.spell.known(edits)
+        if not found and self.spell.distance == 2:
+            found = self._known_two_edits(edits)
+        if not found:
+            return None
+        return max(sorted(found), key=self.spell.__getitem__)
+
+    def _build_index(self):
+        words = list(self.dictionary)
+        keys = array("q")
+        ids = array("l")
+        for word_id, word in enumerate(words):
+            keys.append(hash(word))
+            ids.append(word_id)
+            for i in range(len(word)):
+                keys.append(hash(word[:i] + word[i + 1:]))
+                ids.append(word_id)
+        keys = np.frombuffer(keys, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        return words, keys[order], np.frombuffer(ids, dtype=np.int64)[order]
+
+    def _get_index(self):
+        with self._index_lock:
+            if self._index is None:
+                self._index = self._build_index()
+            return self._index
+
+    def _known_two_edits(self, edits):
+        # Dictionary words one edit away from a one-edit variant of the input
+        # (as SpellChecker's edit-distance-2 step). Such a word and variant
+        # share a single-character delete (or one is the other's delete).
+        variants = [w.lower() for w in edits if self.should_check(w)]
+        if any(c.lower() != c for c in self.letters):
+            return self.spell.known(e2 for e1 in variants for e2 in self.spell.edit_distance_1(e1))
+        found = self.spell.known(e for e in variants if not self.should_check(e))
+        variants = [e for e in variants if self.should_check(e)]
+        if not variants:
+            return found
+
+        words, index_keys, index_ids = self._get_index()
+        query_keys = []
+        owners = []
+        for owner, variant in enumerate(variants):
+            query_keys.append(hash(variant))
+            owners.append(owner)
+            for i in range(len(variant)):
+                query_keys.append(hash(variant[:i] + variant[i + 1:]))
+                owners.append(owner)
+        query_keys = np.array(query_keys, dtype=np.int64)
+        left = np.searchsorted(index_keys, query_keys, side="left")
+        counts = np.searchsorted(index_keys, query_keys, side="right") - left
+        hit = counts > 0
+        left, counts = left[hit], counts[hit]
+        owners = np.repeat(np.array(owners, dtype=np.int64)[hit], counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = index_ids[np.repeat(left, counts) + within]
+
+        for owner, word_id in set(zip(owners.tolist(), candidates.tolist())):
+            word = words[word_id]
+            if word in found:
+                continue
+            if _one_edit(variants[owner], word, self.letters) and self.should_check(word):
+                found.add(word)
+        return found
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_spell_engine():
+    """The process-wide SpellEngine; the dictionary is loaded once."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SpellEngine()
+        return _engine
+
+
+@lru_cache(maxsize=SPELL_CACHE_SIZE)
+def _cached_correction(word):
+    return get_spell_engine().correction(word)
+
 
 def correct_spelling(text):
     """
     Corrects spelling errors in the text while preserving the original structure.
     """
-    spell = SpellChecker()
+    engine = get_spell_engine()
     corrected_text = []
 
     # Split the text into lines to preserve line breaks
-    lines = text.split("\n")
+    lines = [line.split() for line in text.split("\n")]
+
+    # Only words the dictionary doesn't know need a correction search
+    misspelled = engine.spell.unknown({word for words in lines for word in words})
 
-    for line in lines:
+    for words in lines:
         corrected_line = []
-        words = line.split()  # Split each line into words
 
         for word in words:
             # Correct the word if it's misspelled
-            corrected_word = spell.correction(word)
+            if word.lower() in misspelled:
+                corrected_word = _cached_correction(word)
+            else:
+                corrected_word = engine.correction(word)
             # Preserve the original word if the corrected word is None (e.g., for punctuation)
             corrected_line.append(corrected_word if corrected_word is not None else word)
 
@@ -24,4 +183,4 @@ def correct_spelling(text):
         corrected_text.append(" ".join(corrected_line))
 
     # Join the lines back into a single text
-    return "\n".join(corrected_text)
\ No newline at end of file
+    return "\n".join(corrected_text)
@@ -0,0 +1,243 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None  # Token counts are estimated from text length
+
+# Used to count tokens for every model; the hosted models have their own
+# tokenizers, so counts are approximate either way and budgets leave headroom
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Paragraphs, then lines, then words
+SEPARATORS = ("\n\n", "\n", " ")
+
+# Retrieval chunks: size, and how much of the end of a chunk the next one
+# repeats so a passage cut at a boundary is still whole in one of them
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "60"))
+
+# Chunked documents remembered per process (see chunk_document)
+TOKEN_CACHE_DOCS = int(os.getenv("TOKEN_CACHE_DOCS", "64"))
+
+# Context windows of the models used; prompts are kept CONTEXT_HEADROOM
+# below them, as counts from TOKEN_ENCODING only approximate each model's own
+MODEL_CONTEXT_TOKENS = {
+    "llama3-70b-8192": 8192,
+    "llama3-8b-8192": 8192,
+    "gemma2-9b-it": 8192,
+    "mixtral-8x7b-32768": 32768,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+CONTEXT_HEADROOM = float(os.getenv("CONTEXT_HEADROOM", "0.1"))
+
+# A sentence ends at ., ! or ? followed by whitespace, and at every line break
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\s*\n\s*")
+
+_chunk_cache = OrderedDict()
+_chunk_cache_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    The tiktoken encoding, or None when tiktoken is not installed or its
+    BPE file can't be loaded (it is downloaded on first use unless cached
+    in TIKTOKEN_CACHE_DIR, so this happens on offline boxes).
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            if tiktoken is not None:
+                try:
+                    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception:
+                    _encoding = None
+        return _encoding
+
+
+def count_tokens(text):
+    """Number of tokens in text (about 4 characters per token without tiktoken)."""
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_by_tokens(text, max_tokens, separators=SEPARATORS):
+    """
+    Splits text into chunks of at most max_tokens tokens, breaking on the
+    coarsest boundary that fits: paragraphs, then lines, then words (a
+    single word longer than max_tokens becomes its own chunk).
+    Returns a list of (separator, chunk) where separator is the text that
+    joined the chunk to the previous one, so joining them back with their
+    separators restores the structure.
+    """
+    if not text:
+        return []
+    if not separators or count_tokens(text) <= max_tokens:
+        return [("", text)]
+    separator, finer = separators[0], separators[1:]
+    separator_tokens = count_tokens(separator)
+    # Greedy packing on summed part counts (tokens are close to additive
+    # across these boundaries), so the text is tokenized only once per level
+    chunks = []
+    current = []
+    current_tokens = 0
+    for part in text.split(separator):
+        tokens = count_tokens(part)
+        if current and current_tokens + separator_tokens + tokens > max_tokens:
+            chunks.append((separator.join(current), current_tokens))
+            current = []
+            current_tokens = 0
+        current_tokens += (separator_tokens if current else 0) + tokens
+        current.append(part)
+    chunks.append((separator.join(current), current_tokens))
+
+    result = []
+    for chunk, tokens in chunks:
+        pieces = split_by_tokens(chunk, max_tokens, finer) if tokens > max_tokens else [("", chunk)]
+        for index, (piece_separator, piece) in enumerate(pieces):
+            result.append((separator if index == 0 and result else piece_separator, piece))
+    return result
+
+
+def split_sentences(text):
+    """Sentences (and lines) of text, each with the whitespace after it, so they concatenate back into text."""
+    pieces = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() > start:
+            pieces.append(text[start:match.end()])
+            start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+def chunk_by_tokens(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Splits text into chunks of at most max_tokens tokens on sentence and line
+    boundaries (a sentence longer than that is split between words). Each
+    chunk starts with the last sentences of the previous one, up to
+    overlap_tokens. Returns (chunks, token counts).
+    """
+    pieces = []
+    counts = []
+    for sentence in split_sentences(text):
+        parts = [sentence]
+        if count_tokens(sentence) > max_tokens:
+            parts = [separator + part for separator, part in split_by_tokens(sentence, max_tokens, (" ",))]
+        for part in parts:
+            pieces.append(part)
+            counts.append(count_tokens(part))
+
+    chunks = []
+    chunk_counts = []
+    start = 0
+    while start < len(pieces):
+        stop = start
+        total = 0
+        while stop < len(pieces) and (stop == start or total + counts[stop] <= max_tokens):
+            total += counts[stop]
+            stop += 1
+        chunk = "".join(pieces[start:stop]).strip()
+        if chunk:
+            chunks.append(chunk)
+            chunk_counts.append(total)
+        if stop == len(pieces):
+            break
+        # Back up over trailing sentences for the overlap, always moving forward
+        next_start = stop
+        overlap = 0
+        while next_start - 1 > start and overlap + counts[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            overlap += counts[next_start]
+        start = next_start
+    return chunks, chunk_counts
+
+
+def chunk_document(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    chunk_by_tokens(text), remembered for the last TOKEN_CACHE_DOCS texts so
+    questions about the same document don't tokenize it again. The returned
+    lists are shared and must not be modified.
+    """
+    key = (hashlib.sha256(text.encode("utf-8")).digest(), max_tokens, overlap_tokens)
+    with _chunk_cache_lock:
+        if key in _chunk_cache:
+            _chunk_cache.move_to_end(key)
+            return _chunk_cache[key]
+    result = chunk_by_tokens(text, max_tokens, overlap_tokens)
+    with _chunk_cache_lock:
+        _chunk_cache[key] = result
+        while len(_chunk_cache) > TOKEN_CACHE_DOCS:
+            _chunk_cache.popitem(last=False)
+    return result
+
+
+def prompt_budget(model, completion_tokens, *fixed_texts):
+    """
+    Tokens left for document context in a prompt to model: its context
+    window less the headroom, the completion and the fixed parts of the
+    prompt (instructions, question).
+    """
+    window = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    used = completion_tokens + sum(count_tokens(text) for text in fixed_texts)
+    return max(0, int(window * (1 - CONTEXT_HEADROOM)) - used)
+
+
+def pack_chunks(counts, order, budget, separator_tokens=1):
+    """
+    Chunk indices to send: taken from order (best first) while they fit in
+    budget tokens, skipping any that don't. Returned in document order.
+    """
+    selected = []
+    used = 0
+    for chunk in order:
+        cost = counts[chunk] + (separator_tokens if selected else 0)
+        if used + cost <= budget:
+            selected.append(chunk)
+            used += cost
+    return sorted(selected)
+
+
+def pack_top_chunks(counts, rank, budget, separator_tokens=1):
+    """
+    pack_chunks over the best-first order of rank(k), a function returning
+    the indices of the (at most) k best chunks, or over all chunks in order
+    if rank finds none. rank is only asked for as many chunks as can still
+    change the selection: k starts at the most chunks that fit in budget and
+    doubles while the unranked chunks could still fill the budget left.
+    """
+    if not counts:
+        return []
+    smallest = sorted(counts)
+    fit = used = 0
+    for count in smallest:
+        used += count + (separator_tokens if fit else 0)
+        if used > budget:
+            break
+        fit += 1
+    k = max(1, fit)
+    while True:
+        order = rank(k)
+        if not order:
+            return pack_chunks(counts, range(len(counts)), budget, separator_tokens)
+        selected = pack_chunks(counts, order, budget, separator_tokens)
+        if len(order) < k or k >= len(counts):
+            return selected
+        ranked = set(order)
+        left = budget - sum(counts[chunk] for chunk in selected) - separator_tokens * len(selected)
+        if min(count for chunk, count in enumerate(counts) if chunk not in ranked) > left:
+            return selected
+        k *= 2
@@ -53,6 +53,22 @@ function downloadFile(content, filename, type) {
     window.URL.revokeObjectURL(url);
 }
 
+async function readNDJSONStream(response, onEvent) {
+    // Calls onEvent for every JSON line of a streamed response body
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => onEvent(JSON.parse(line)));
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+}
+
 function copyToClipboard(text) {
     navigator.clipboard.writeText(text).then(() => {
         showNotification('Text copied to clipboard!', 'success');
@@ -180,26 +196,51 @@ function initPlagiarismChecker() {
                 formData.append('files[]', file);
             });
 
-            // ---- Updated: Use new API endpoint and JSON ----
-            const response = await fetch('/api/plagiarism', {
+            // Stream one NDJSON event per scored pair and render rows as they arrive
+            const response = await fetch('/api/plagiarism/stream', {
                 method: 'POST',
                 body: formData
             });
 
-            const data = await response.json();
-
-            if (!data.success) {
+            if (!response.ok) {
+                const data = await response.json();
                 throw new Error(data.error || 'Unknown error');
             }
 
-            // Show results in table
             const tableContainer = document.getElementById('plagiarism-table-container');
-            if (tableContainer) {
-                tableContainer.innerHTML = plagiarismResultsToHTMLTable(data.results, data.file_names);
-            }
-            results.classList.remove('hidden');
+            const rows = [];
+            let jobId = null;
+            let tbody = null;
+            let progress = null;
+
+            await readNDJSONStream(response, event => {
+                if (event.event === 'start') {
+                    jobId = event.job_id;
+                    if (tableContainer) {
+                        tableContainer.innerHTML = '<p class="plagiarism-progress"></p>' +
+                            plagiarismResultsToHTMLTable([]);
+                        tbody = tableContainer.querySelector('tbody');
+                        progress = tableContainer.querySelector('.plagiarism-progress');
+                    }
+                    results.classList.remove('hidden');
+                } else if (event.event === 'row') {
+                    rows[event.position] = event.row;
+                    if (tbody) tbody.insertAdjacentHTML('beforeend', plagiarismRowToHTML(event.row));
+                    if (progress) progress.textContent = `Compared ${event.completed} of ${event.total} pairs...`;
+                } else if (event.event === 'summary') {
+                    if (progress) {
+                        progress.textContent = `Compared ${event.completed} pairs in ${event.elapsed_seconds}s`;
+                    }
+                } else if (event.event === 'error') {
+                    throw new Error(event.error);
+                }
+            });
+
+            // Re-render in pair order once everything has arrived
+            const orderedRows = rows.filter(row => row);
+            if (tbody) tbody.innerHTML = orderedRows.map(plagiarismRowToHTML).join('');
             showNotification('Similarity analysis completed!', 'success');
-            setupPlagiarismDownloadHandlers(data.results, data.file_names);
+            setupPlagiarismDownloadHandlers(jobId);
         } catch (error) {
             console.error('Error:', error);
             showNotification('Error processing documents: ' + error.message, 'error');
@@ -208,49 +249,45 @@ function initPlagiarismChecker() {
         }
     });
 
-    function plagiarismResultsToHTMLTable(results, fileNames) {
-        // Assume results is a 2D array or similar structure
-        let html = '<table><thead><tr><th></th>';
-        fileNames.forEach(name => html += `<th>${name}</th>`);
+    const PLAGIARISM_COLUMNS = [
+        'Doc 1', 'Doc 2', 'Cosine_TFIDF', 'Cosine_Count', 'Jaccard', 'LCS', 'LSH', 'NGram',
+        'Average Similarity (%)'
+    ];
+
+    function escapeHTML(value) {
+        return String(value).replace(/[&<>"']/g, ch => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[ch]);
+    }
+
+    function formatPlagiarismCell(value) {
+        // LCS skipped by the LCS cutoff comes back as null; file names
+        // are user-supplied, so every cell is escaped like the HTML export
+        return escapeHTML(value === null || value === undefined ? 'skipped' : value);
+    }
+
+    function plagiarismRowToHTML(row) {
+        return '<tr>' + PLAGIARISM_COLUMNS.map(col => `<td>${formatPlagiarismCell(row[col])}</td>`).join('') + '</tr>';
+    }
+
+    function plagiarismResultsToHTMLTable(results) {
+        let html = '<table><thead><tr>';
+        PLAGIARISM_COLUMNS.forEach(col => html += `<th>${col}</th>`);
         html += '</tr></thead><tbody>';
-        results.forEach((row, i) => {
-            html += `<tr><th>${fileNames[i]}</th>`;
-            row.forEach(cell => html += `<td>${cell}</td>`);
-            html += '</tr>';
-        });
+        results.forEach(row => html += plagiarismRowToHTML(row));
         html += '</tbody></table>';
         return html;
     }
 
-    function setupPlagiarismDownloadHandlers(results, fileNames) {
+    function setupPlagiarismDownloadHandlers(jobId) {
         const csvBtn = document.getElementById('plagiarism-download-csv');
         const htmlBtn = document.getElementById('plagiarism-download-html');
-        // Build CSV/HTML from results
-        if (csvBtn) {
-            csvBtn.onclick = () => {
-                let csv = [',' + fileNames.join(',')];
-                results.forEach((row, i) => {
-                    csv.push([fileNames[i], ...row].join(','));
-                });
-                downloadFile(csv.join('\n'), 'similarity_results.csv', 'text/csv');
-            };
-        }
-        if (htmlBtn) {
-            htmlBtn.onclick = () => {
-                let html = plagiarismResultsToHTMLTable(results, fileNames);
-                let report = `
-                <!DOCTYPE html>
-                <html>
-                <head><title>Document Similarity Report</title></head>
-                <body>
-                  <h1>Document Similarity Analysis Report</h1>
-                  <p>Generated on: ${new Date().toLocaleString()}</p>
-                  ${html}
-                </body>
-                </html>`;
-                downloadFile(report, 'similarity_report.html', 'text/html');
-            };
-        }
+        // Exports are streamed by the server from the stored job results
+        const download = format => {
+            window.location.href = `/api/plagiarism/download?job_id=${encodeURIComponent(jobId)}&format=${encodeURIComponent(format)}`;
+        };
+        if (csvBtn) csvBtn.onclick = () => download('csv');
+        if (htmlBtn) htmlBtn.onclick = () => download('html');
     }
 }
 
@@ -315,7 +352,7 @@ function initPDFChatbot() {
             });
             const data = await resp.json();
             if (data.success) {
-                tempPdfRef = data.temp_pdf;
+                tempPdfRef = data.doc_id;
                 uploadArea.innerHTML = `
                 <i class="fas fa-check-circle" style="color: #10b981; font-size: 48px;"></i>
                 <p style="color: #10b981; font-weight: bold;">${file.name} uploaded successfully!</p>
@@ -361,25 +398,19 @@ function initPDFChatbot() {
 
         try {
             const formData = new FormData();
-            formData.append('temp_pdf', tempPdfRef);
+            formData.append('doc_id', tempPdfRef);
             formData.append('question', message);
 
-            const resp = await fetch('/api/rag_pdf/ask', {
+            // Rendered as it streams in
+            const answer = await streamBotMessage('/api/rag_pdf/ask/stream', {
                 method: 'POST',
                 body: formData
-            });
-            const data = await resp.json();
-            typingDiv.remove();
-            if (data.success) {
-                addMessage('bot', data.answer);
-                saveToHistory('pdf', currentChatId, message, data.answer);
-            } else {
-                addMessage('bot', data.error || 'I apologize, but I encountered an error processing your question. Please try again.');
-            }
+            }, chatMessages, typingDiv);
+            saveToHistory('pdf', currentChatId, message, answer);
         } catch (error) {
             typingDiv.remove();
             console.error('Error:', error);
-            addMessage('bot', 'I apologize, but I encountered an error processing your question. Please try again.');
+            addMessage('bot', error.message || 'I apologize, but I encountered an error processing your question. Please try again.');
         }
     }
 
@@ -639,23 +670,17 @@ function initYouTubeAnalyzer() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
 
         try {
-            const resp = await fetch('/api/youtube/ask', {
+            // Rendered as it streams in
+            const answer = await streamBotMessage('/api/youtube/ask/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ question })
-            });
-            const data = await resp.json();
-            typingDiv.remove();
-            if (data.success) {
-                addMessage('bot', data.answer);
-                saveToHistory('youtube', currentChatId, question, data.answer);
-            } else {
-                addMessage('bot', data.error || 'I apologize, but I encountered an error processing your question. Please try again.');
-            }
+            }, chatMessages, typingDiv);
+            saveToHistory('youtube', currentChatId, question, answer);
         } catch (error) {
             typingDiv.remove();
             console.error('Error:', error);
-            addMessage('bot', 'I apologize, but I encountered an error processing your question. Please try again.');
+            addMessage('bot', error.message || 'I apologize, but I encountered an error processing your question. Please try again.');
         }
     }
 
@@ -791,7 +816,8 @@ function initWebURLAnalyzer() {
             });
             const data = await response.json();
             if (data.success) {
-                currentWebsiteContent = data.result.content || '';
+                // The API returns the start of the page text as 'summary'
+                currentWebsiteContent = data.result.content || data.result.summary || '';
                 currentWebsiteTitle = getDomainFromURL(url);
                 addMessage('bot', `I've successfully analyzed the website "${currentWebsiteTitle}". The content has been extracted and processed. You can now ask me questions about this website, or click "Website Content" to view the full extracted content.`);
                 saveToHistory('weburl', currentChatId, url, 'Website content analyzed successfully');
@@ -819,23 +845,17 @@ function initWebURLAnalyzer() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
 
         try {
-            const response = await fetch('/api/web_analyze', {
+            // Rendered as it streams in
+            const answer = await streamBotMessage('/api/web_analyze/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ url: currentWebURL, question })
-            });
-            const data = await response.json();
-            typingDiv.remove();
-            if (data.success) {
-                addMessage('bot', data.result.answer || JSON.stringify(data.result));
-                saveToHistory('weburl', currentChatId, question, data.result.answer || JSON.stringify(data.result));
-            } else {
-                addMessage('bot', data.error || 'I apologize, but I encountered an error processing your question. Please try again.');
-            }
+            }, chatMessages, typingDiv);
+            saveToHistory('weburl', currentChatId, question, answer);
         } catch (error) {
             typingDiv.remove();
             console.error('Error:', error);
-            addMessage('bot', 'I apologize, but I encountered an error processing your question. Please try again.');
+            addMessage('bot', error.message || 'I apologize, but I encountered an error processing your question. Please try again.');
         }
     }
 
@@ -53,6 +53,74 @@ setupFileUpload('pdf-input', 'pdf-upload', 'pdf-send-btn', 'plagiarism-file-list
 // AJAX form handling (optional advanced setup):
 // You could add fetch() here to send files/inputs to Flask endpoints if desired.
 
+// Server-Sent Events over fetch (EventSource can't POST): calls
+// onEvent(name, data) for every event of a streamed response body
+async function readSSEStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  const dispatch = (block) => {
+    let name = 'message';
+    const data = [];
+    block.split('\n').forEach(line => {
+      if (line.startsWith('event:')) name = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+    });
+    if (data.length) onEvent(name, JSON.parse(data.join('\n')));
+  };
+  try {
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const blocks = buffer.split('\n\n');
+      buffer = blocks.pop();
+      blocks.filter(block => block.trim()).forEach(dispatch);
+    }
+    if (buffer.trim()) dispatch(buffer);
+  } finally {
+    // Stops the download (and the server's generation) if onEvent threw
+    reader.cancel().catch(() => {});
+  }
+}
+
+// Posts to a streaming answer endpoint and renders the answer into a new bot
+// message as it arrives. Removes typingDiv on the first token. Resolves with
+// the full text; rejects with the server's error message.
+async function streamBotMessage(url, options, chatMessages, typingDiv) {
+  const response = await fetch(url, options);
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.error || `Request failed (${response.status})`);
+  }
+  let messageDiv = null;
+  let paragraph = null;
+  let text = '';
+  await readSSEStream(response, (event, data) => {
+    if (event === 'token') {
+      if (!messageDiv) {
+        if (typingDiv) typingDiv.remove();
+        messageDiv = document.createElement('div');
+        messageDiv.className = 'message bot';
+        paragraph = document.createElement('p');
+        messageDiv.appendChild(paragraph);
+        chatMessages.appendChild(messageDiv);
+      }
+      text += data.text;
+      paragraph.textContent = text;
+      chatMessages.scrollTop = chatMessages.scrollHeight;
+    } else if (event === 'done') {
+      if (messageDiv) messageDiv.dataset.ttft = data.ttft_seconds;
+      console.debug(`${url}: first token ${data.ttft_seconds}s, total ${data.total_seconds}s`);
+    } else if (event === 'error') {
+      throw new Error(data.error);
+    }
+  });
+  if (typingDiv) typingDiv.remove();
+  if (!messageDiv) throw new Error('The model returned an empty answer.');
+  return text;
+}
+
 
 // On page load – ensure "home" is active
 document.addEventListener('DOMContentLoaded', () => {
@@ -0,0 +1,41 @@
+from python_scripts.document_store import document_owner
+
+PROXY = "10.0.0.2"
+
+
+def test_spoofed_user_header_is_ignored_by_default():
+    headers = {"X-User-Id": "victim", "X-Forwarded-For": "203.0.113.9"}
+    assert document_owner(headers, "198.51.100.7", trust_header=False, trusted_proxies=frozenset()) == "198.51.100.7"
+
+
+def test_default_settings_ignore_the_header():
+    assert document_owner({"X-User-Id": "victim"}, "198.51.100.7") == "198.51.100.7"
+
+
+def test_user_header_from_trusted_proxy():
+    headers = {"X-User-Id": "alice", "X-Forwarded-For": "203.0.113.9"}
+    assert document_owner(headers, PROXY, trust_header=False, trusted_proxies={PROXY}) == "alice"
+
+
+def test_user_header_from_untrusted_address_is_ignored():
+    headers = {"X-User-Id": "victim"}
+    assert document_owner(headers, "198.51.100.7", trust_header=False, trusted_proxies={PROXY}) == "198.51.100.7"
+
+
+def test_trusted_proxy_without_header_uses_forwarded_client():
+    headers = {"X-Forwarded-For": "192.0.2.1, 203.0.113.9"}
+    assert document_owner(headers, PROXY, trust_header=False, trusted_proxies={PROXY}) == "203.0.113.9"
+
+
+def test_forwarded_for_from_untrusted_address_is_ignored():
+    headers = {"X-Forwarded-For": "203.0.113.9"}
+    assert document_owner(headers, "198.51.100.7", trust_header=False, trusted_proxies={PROXY}) == "198.51.100.7"
+
+
+def test_trust_user_header_setting():
+    assert document_owner({"X-User-Id": "alice"}, "198.51.100.7", trust_header=True,
+                          trusted_proxies=frozenset()) == "alice"
+
+
+def test_anonymous_without_address():
+    assert document_owner({}, None, trust_header=False, trusted_proxies=frozenset()) == "anonymous"
@@ -0,0 +1,140 @@
+import random
+
+import pytest
+
+from plag.lcs import lcs, lcs_length, lcs_upper_bound, tokenize
+
+ALPHABETS = ["ab", "abcd", "abcdefghij", "aé中😀 b"]
+WORDS = ["the", "cat", "sat", "on", "a", "mat", "naïve", "日本", "the", "the"]
+
+
+def dp_lcs_length(X, Y):
+    """The quadratic DP table lcs() used before the bit-parallel version."""
+    m, n = len(X), len(Y)
+    dp = [[0] * (n + 1) for _ in range(m + 1)]
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            if X[i - 1] == Y[j - 1]:
+                dp[i][j] = dp[i - 1][j - 1] + 1
+            else:
+                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
+    return dp[m][n]
+
+
+def dp_lcs(X, Y):
+    return dp_lcs_length(X, Y) / max(len(X), len(Y))
+
+
+def random_text(rng, alphabet, max_length):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+
+
+def random_words(rng, max_length):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, max_length)))
+
+
+def random_pairs(count, seed, make):
+    rng = random.Random(seed)
+    return [(make(rng), make(rng)) for _ in range(count)]
+
+
+CHAR_PAIRS = random_pairs(400, 0, lambda rng: random_text(rng, rng.choice(ALPHABETS), 150))
+WORD_PAIRS = random_pairs(200, 1, lambda rng: random_words(rng, 80))
+
+
+@pytest.mark.parametrize("X,Y", CHAR_PAIRS)
+def test_lcs_length_matches_dp_on_chars(X, Y):
+    assert lcs_length(X, Y) == dp_lcs_length(X, Y)
+
+
+@pytest.mark.parametrize("X,Y", WORD_PAIRS)
+def test_lcs_length_matches_dp_on_words(X, Y):
+    assert lcs_length(X.split(), Y.split()) == dp_lcs_length(X.split(), Y.split())
+
+
+@pytest.mark.parametrize("X,Y", [pair for pair in CHAR_PAIRS if pair[0] or pair[1]])
+def test_lcs_matches_dp(X, Y):
+    assert lcs(X, Y) == pytest.approx(dp_lcs(X, Y))
+
+
+@pytest.mark.parametrize("X,Y", [pair for pair in WORD_PAIRS if pair[0] or pair[1]])
+def test_lcs_matches_dp_on_words(X, Y):
+    assert lcs(X, Y, granularity="word") == pytest.approx(dp_lcs(X.split(), Y.split()))
+
+
+def test_long_sequences_cross_word_boundaries():
+    # Rows wider than 64 bits, and min_length checks every 64 tokens
+    rng = random.Random(2)
+    X = random_text(rng, "abc", 700)
+    Y = random_text(rng, "abc", 500)
+    assert lcs_length(X, Y) == dp_lcs_length(X, Y)
+
+
+@pytest.mark.parametrize("X,Y,expected", [
+    ("", "", 0),
+    ("", "abc", 0),
+    ("abc", "", 0),
+    ("aaaa", "aa", 2),
+    ("abab", "baba", 3),
+    ("日本語テキスト", "日本のテキスト", 6),
+    ("😀😀a😀", "😀a😀😀", 3),
+])
+def test_lcs_length_edge_cases(X, Y, expected):
+    assert lcs_length(X, Y) == expected == dp_lcs_length(X, Y)
+
+
+def test_empty_strings():
+    assert lcs("", "") == 0.0
+    assert lcs("", "abc") == 0.0
+    assert lcs("abc", "", granularity="word") == 0.0
+    assert lcs("", "", min_score=0.5) == 0.0
+
+
+def test_repeated_tokens():
+    assert lcs("the the the cat", "the cat the the", granularity="word") == pytest.approx(3 / 4)
+    assert lcs("a" * 100, "a" * 40) == pytest.approx(0.4)
+
+
+@pytest.mark.parametrize("X,Y", CHAR_PAIRS[:200] + WORD_PAIRS[:100])
+def test_upper_bound_is_an_upper_bound(X, Y):
+    assert lcs_upper_bound(X, Y) >= dp_lcs_length(X, Y)
+    assert lcs_upper_bound(X.split(), Y.split()) >= dp_lcs_length(X.split(), Y.split())
+
+
+def test_upper_bound_counts_shared_tokens():
+    assert lcs_upper_bound("aab", "abb") == 2
+    assert lcs_upper_bound("abc", "xyz") == 0
+    assert lcs_upper_bound("", "abc") == 0
+    # Order is ignored: the bound is reached by an anagram, the LCS is not
+    assert lcs_upper_bound("abc", "cba") == 3
+    assert dp_lcs_length("abc", "cba") == 1
+
+
+@pytest.mark.parametrize("min_score", [0.0, 0.3, 0.5, 0.8, 1.0])
+@pytest.mark.parametrize("X,Y", [pair for pair in CHAR_PAIRS[:150] if pair[0] or pair[1]])
+def test_min_score_is_exact_above_and_below_under(X, Y, min_score):
+    exact = dp_lcs(X, Y)
+    score = lcs(X, Y, min_score=min_score)
+    if exact >= min_score:
+        # Pairs that reach min_score get their exact score
+        assert score == pytest.approx(exact)
+    else:
+        # Others may stop early, returning a bound that is still below min_score
+        assert exact - 1e-12 <= score < min_score
+
+
+def test_min_score_stops_early_on_dissimilar_pairs():
+    X = "ab" * 500
+    Y = "ab" * 5 + "c" * 990
+    # The token counts alone rule the pair out
+    assert lcs(X, Y, min_score=0.5) == pytest.approx(lcs_upper_bound(X, Y) / 1000)
+    # min_length returns a bound below it as soon as it is out of reach
+    bound = lcs_length("a" * 1000, "a" * 10 + "b" * 990, min_length=500)
+    assert 10 <= bound < 500
+
+
+def test_tokenize():
+    assert tokenize("a b", "char") == "a b"
+    assert tokenize(" a  b ", "word") == ["a", "b"]
+    with pytest.raises(ValueError):
+        tokenize("a", "sentence")
@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+import features.plagiarism_checker as checker
+from plag.cosine_similarity import cosine_similarity_count, cosine_similarity_tfidf
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+
+
+def random_texts(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("block_size", [None, 1, 4, 1000])
+def test_thread_backend_scores_cosines_per_block(monkeypatch, block_size):
+    calls = []
+    real_pairs = checker.cosine_similarity_pairs
+
+    def spy(rows, pairs, block_size=None):
+        calls.append(len(pairs))
+        return real_pairs(rows, pairs, block_size)
+
+    monkeypatch.setattr(checker, "cosine_similarity_pairs", spy)
+    texts = random_texts(12)
+    rows = checker.compare_texts(texts, backend="thread", block_size=block_size)
+    pairs = len(texts) * (len(texts) - 1) // 2
+    chunk = block_size or checker.THREAD_BLOCK_PAIRS
+    # One call per chunk for each of the two cosine weightings
+    assert sorted(calls) == sorted([min(chunk, pairs - start) for start in range(0, pairs, chunk)] * 2)
+    assert len(rows) == pairs
+
+
+def test_block_scores_match_per_pair_scores():
+    texts = random_texts(9, seed=1)
+    scorer = checker.PairScorer(texts, [f"Doc_{i + 1}" for i in range(len(texts))], cosine_mode="corpus")
+    pairs = [(i, j) for i in range(len(texts)) for j in range(i + 1, len(texts))]
+    rows = scorer.compare_pairs(pairs)
+    for (i, j), row in zip(pairs, rows):
+        assert row == scorer.compare_pair(i, j)
+    pairwise = checker.compare_texts(texts[:2], cosine_mode="pairwise")[0]
+    assert pairwise["Cosine_TFIDF"] == round(float(cosine_similarity_tfidf(texts[0], texts[1])) * 100, 2)
+    assert pairwise["Cosine_Count"] == round(float(cosine_similarity_count(texts[0], texts[1])) * 100, 2)
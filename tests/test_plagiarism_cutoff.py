@@ -0,0 +1,49 @@
+import plag.lcs
+from features.plagiarism_checker import compare_texts
+
+TEXTS = [
+    "the quick brown fox jumps over the lazy dog near the river bank",
+    "the quick brown fox jumps over the lazy dog near the river bend",
+    "zzz qqq vvv kkk www yyy jjj xxx",
+]
+OTHER_METRICS = ("Cosine_TFIDF", "Cosine_Count", "Jaccard", "LSH", "NGram")
+
+
+def rows_by_pair(rows):
+    return {(row["Doc 1"], row["Doc 2"]): row for row in rows}
+
+
+def test_pair_below_cutoff_skips_lcs_scan(monkeypatch):
+    scanned = []
+    real_lcs_length = plag.lcs.lcs_length
+
+    def spy(X, Y, min_length=None):
+        scanned.append((len(X), len(Y)))
+        return real_lcs_length(X, Y, min_length=min_length)
+
+    monkeypatch.setattr(plag.lcs, "lcs_length", spy)
+    rows = rows_by_pair(compare_texts([TEXTS[0], TEXTS[2]], lcs_cutoff=50, return_spans=True))
+    row = rows[("Doc_1", "Doc_2")]
+    assert row["LCS"] is None
+    assert row["Matches"] is None
+    assert scanned == []
+
+
+def test_pair_above_cutoff_is_scored_exactly():
+    full = rows_by_pair(compare_texts(TEXTS, return_spans=True))
+    cut = rows_by_pair(compare_texts(TEXTS, lcs_cutoff=50, return_spans=True))
+    similar = ("Doc_1", "Doc_2")
+    assert cut[similar]["LCS"] == full[similar]["LCS"] >= 50
+    assert cut[similar]["Matches"] == full[similar]["Matches"]
+
+
+def test_cutoff_never_skips_an_lcs_at_or_above_it():
+    full = rows_by_pair(compare_texts(TEXTS))
+    for cutoff in (0, 10, 30, 60, 90, 100):
+        for pair, row in rows_by_pair(compare_texts(TEXTS, lcs_cutoff=cutoff)).items():
+            if row["LCS"] is None:
+                assert full[pair]["LCS"] < cutoff
+            else:
+                assert row["LCS"] == full[pair]["LCS"]
+            for name in OTHER_METRICS:
+                assert row[name] == full[pair][name]
@@ -1,49 +1,154 @@
-import os
+import hashlib
+import threading
+from collections import OrderedDict
+from python_scripts.bm25 import BM25Index
+from python_scripts.llm_gateway import get_llm_gateway
+from python_scripts.tokens import (
+    TOKEN_CACHE_DOCS, chunk_document, count_tokens, pack_top_chunks, prompt_budget,
+)
 
-# Dynamically get the correct file path
-file_path = os.path.join(os.getcwd(), "temp_files", "transcripts_with_timestamps.txt")
+MODEL = "llama3-70b-8192"
+MAX_COMPLETION_TOKENS = 1024
 
-def load_text(file_path):
+SYSTEM_PROMPT = (
+    "You are an AI assistant. You will be given a transcript, and "
+    "your task is to answer questions based on its content accurately."
+    "you can answer outside the content also but related to content topic"
+)
+SUMMARY_PROMPT = "Please provide a concise summary of the following YouTube video transcript:\n\n{transcript}\n\nSummary:"
+# Transcripts too long for one prompt are summarized part by part, then the
+# summaries of the parts are summarized
+PART_SUMMARY_PROMPT = (
+    "Summarize this part of a YouTube video transcript, keeping its key points:\n\n{transcript}\n\nSummary:"
+)
+COMBINE_PROMPT = (
+    "Here are summaries of consecutive parts of a YouTube video transcript. "
+    "Please provide a concise summary of the whole video:\n\n{transcript}\n\nSummary:"
+)
+
+# Token count and BM25 index of the last TOKEN_CACHE_DOCS transcripts, keyed
+# by their SHA-256 (the chunks are cached by chunk_document)
+_transcript_indexes = OrderedDict()
+_transcript_indexes_lock = threading.Lock()
+
+def _transcript_index(transcript_text):
+    # Token count, chunks and their BM25 index, so repeat questions about a
+    # transcript don't tokenize it again
+    chunks, token_counts = chunk_document(transcript_text)
+    key = hashlib.sha256(transcript_text.encode("utf-8")).digest()
+    with _transcript_indexes_lock:
+        cached = _transcript_indexes.get(key)
+        if cached is not None:
+            _transcript_indexes.move_to_end(key)
+    if cached is None:
+        cached = (count_tokens(transcript_text), BM25Index.build(chunks))
+        with _transcript_indexes_lock:
+            _transcript_indexes[key] = cached
+            while len(_transcript_indexes) > TOKEN_CACHE_DOCS:
+                _transcript_indexes.popitem(last=False)
+    total, index = cached
+    return total, chunks, token_counts, index
+
+def fit_transcript(transcript_text, question, budget):
+    """
+    The transcript if it fits in budget tokens, otherwise its chunks most
+    relevant to the question (by BM25) that fit, in transcript order.
+    """
+    total, chunks, token_counts, index = _transcript_index(transcript_text)
+    if total <= budget:
+        return transcript_text
+    selected = pack_top_chunks(token_counts, lambda k: [chunk for chunk, _ in index.top_k(question, k)],
+                               budget, count_tokens("\n\n"))
+    return "\n\n".join(chunks[chunk] for chunk in selected)
+
+def _request(prompt, max_tokens=MAX_COMPLETION_TOKENS, temperature=0.5):
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        "model": MODEL,
+        "temperature": temperature,
+        "max_completion_tokens": max_tokens,
+        "top_p": 1,
+        "stop": None,
+    }
+
+def _complete(client, prompt):
+    chat_completion = client.chat(**_request(prompt))
+    return chat_completion.choices[0].message.content
+
+def _question_prompt(question, transcript_text):
+    budget = prompt_budget(MODEL, MAX_COMPLETION_TOKENS, SYSTEM_PROMPT,
+                           f"Transcript: \n\nQuestion: {question}")
+    transcript_text = fit_transcript(transcript_text, question, budget)
+    return f"Transcript: {transcript_text}\n\nQuestion: {question}"
+
+def ask_groq(question, transcript_text, client=None):
     """
-    Reads the transcript text file and returns its content.
+    Answers a question about the transcript. Long transcripts are cut down
+    to the parts relevant to the question that fit in the model's context
+    window. client is the LLM gateway to use (default: the shared one).
     """
+    client = client or get_llm_gateway()
+    if not transcript_text:
+        return "Error: no transcript provided."
+
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return file.read()
-    except FileNotFoundError:
-        return "Error: transcript file not found."
-
-def ask_groq(question, transcript_text, client):
-
-    transcript_text = load_text(file_path=file_path)
-    
-    if "Error" in transcript_text:
-        return transcript_text  # Return error if the file is missing
-    
+        return _complete(client, _question_prompt(question, transcript_text))
+
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+def _iter_summary_steps(transcript_text, client):
+    # Yields ("part", number, parts) after each part is summarized, then
+    # ("prompt", prompt) for the final request
+    budget = prompt_budget(MODEL, MAX_COMPLETION_TOKENS, SYSTEM_PROMPT, PART_SUMMARY_PROMPT)
+    if count_tokens(transcript_text) <= budget:
+        yield ("prompt", SUMMARY_PROMPT.format(transcript=transcript_text))
+        return
+    parts, _ = chunk_document(transcript_text, max_tokens=budget, overlap_tokens=0)
+    summaries = []
+    for part in parts:
+        summaries.append(_complete(client, PART_SUMMARY_PROMPT.format(transcript=part)))
+        yield ("part", len(summaries), len(parts))
+    combined = "\n\n".join(summaries)
+    combine_budget = prompt_budget(MODEL, MAX_COMPLETION_TOKENS, SYSTEM_PROMPT, COMBINE_PROMPT)
+    if count_tokens(combined) > combine_budget:
+        # Very long videos: summarize the summaries the same way
+        yield from _iter_summary_steps(combined, client)
+        return
+    yield ("prompt", COMBINE_PROMPT.format(transcript=combined))
+
+def summarize_groq(transcript_text, client=None):
+    """
+    Summarizes the transcript in one request when it fits in the model's
+    context window; otherwise summarizes consecutive parts that do, then
+    combines their summaries.
+    """
+    client = client or get_llm_gateway()
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an AI assistant. You will be given a transcript, and "
-                        "your task is to answer questions based on its content accurately."
-                        "you can answer outside the content also but related to content topic"
-                    ),
-                },
-                {"role": "user", "content": f"Transcript: {transcript_text}\n\nQuestion: {question}"},
-            ],
-            model="llama3-70b-8192",
-            temperature=0.5,
-            max_completion_tokens=1024,
-            top_p=1,
-            stop=None,
-            stream=False,
-        )
-        
-        return chat_completion.choices[0].message.content
-    
+        for step in _iter_summary_steps(transcript_text, client):
+            if step[0] == "prompt":
+                return _complete(client, step[1])
+
     except Exception as e:
         return f"Error: {str(e)}"
 
+def stream_groq(question, transcript_text, client=None):
+    """Like ask_groq, but returns a generator of streamed events (see stream_chat_completion)."""
+    client = client or get_llm_gateway()
+    return client.stream(**_request(_question_prompt(question, transcript_text)))
 
+def stream_summary_groq(transcript_text, client=None):
+    """
+    Like summarize_groq, but yields streamed events: {"event": "progress",
+    "part": ..., "parts": ...} as parts of a long transcript are summarized,
+    then the final summary's events (see stream_chat_completion).
+    """
+    client = client or get_llm_gateway()
+    for step in _iter_summary_steps(transcript_text, client):
+        if step[0] == "part":
+            yield {"event": "progress", "part": step[1], "parts": step[2]}
+        else:
+            yield from client.stream(**_request(step[1]))